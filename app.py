@@ -1,164 +1,250 @@
-from flask import Flask, flash, redirect, render_template, request, session, abort, g
+# startup is timed from here on, for `flask startup-report`
+from data.diagnostics import BootTimer, startup_report
+boot = BootTimer()
+
+from flask import Flask, flash, redirect, render_template, request, session, abort, g, Response, jsonify, stream_with_context, stream_template
+from flask import before_render_template, template_rendered
 from flask_restful import Api
-from resources import User
-from PyDictionary import PyDictionary
-from wordnik import *
-import pandas as pd
-import random
+from resources import User, Word, WordList
 import os
-import ast 
+import io
+import click
+import time
+from itertools import islice
 #import sqlite3
-#from data.models import insert_user, retrieve_users
+from data.models import check_password, insert_user, retrieve_user
+from providers import DEFAULT_POLICY, create_registry
+from page_cache import PageCache
+from data.store import normalize_word, open_store
+from data.fetch_cache import FetchCache
+from data.bulk import FORMATS, MalformedUpload, export_rows, import_rows, read_rows
+from data.jobs import ADDED, EXISTS, PENDING, AddJobs
+from data.study import RIGHT, WRONG, StudyScheduler
+from data.fuzzy import FuzzyIndex
+from data.fulltext import DefinitionIndex
+from data import metrics
+boot.mark('imports')
+
+# a .db / .sqlite path switches to the SQLite backend (see data/sqlite_store.py)
+path_to_dict = os.environ.get('DICTIONARY_PATH', 'data/My_Dictionary.csv')
+store = open_store(path_to_dict)
+store.start_compactor()
+boot.mark('store')
+
+# spaced-repetition review state, kept next to the dictionary and in step
+# with it through the store's change notifications
+scheduler = StudyScheduler(os.path.splitext(path_to_dict)[0] + '.study.db')
+store.subscribe(scheduler)
 
-path_to_dict = 'data/My_Dictionary.csv'
+# "did you mean" suggestions when a lookup misses
+fuzzy = FuzzyIndex()
+store.subscribe(fuzzy)
 
-pd.set_option('display.max_colwidth', -1)
+# ranked search over what the words mean
+definitions = DefinitionIndex()
+store.subscribe(definitions)
+
+# built once and shared by every request: long-lived provider clients on a
+# pooled HTTP session, combined with PROVIDER_POLICY ('priority', 'first' or
+# 'merge') and backed by an on-disk cache of past answers, hits and misses
+providers = create_registry(policy=os.environ.get('PROVIDER_POLICY', DEFAULT_POLICY),
+                            cache=FetchCache(os.environ.get('FETCH_CACHE_PATH', 'data/fetch_cache.db')))
+
+# words being added in the background, fetched through `providers`
+jobs = AddJobs(store, providers)
+boot.mark('services')
 
 app = Flask(__name__)
+
+# Opt-in instrumentation (DICTIONARY_METRICS=1, see data/metrics.py): request
+# timings and template rendering spans on top of the storage, provider and
+# cache instrumentation, served at /metrics. The hooks are only installed
+# when it is on, so otherwise requests do not pay for them.
+if metrics.enabled:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def stop_request_timer(response):
+        metrics.observe_request(request.endpoint or 'unknown', request.method, response.status_code,
+                                time.perf_counter() - g.request_started)
+        return response
+
+    def template_started(sender, template, context, **extra):
+        g.setdefault('templates_started', []).append(time.perf_counter())
+
+    def template_finished(sender, template, context, **extra):
+        metrics.observe('render.' + str(template.name), time.perf_counter() - g.templates_started.pop())
+
+    before_render_template.connect(template_started, app)
+    template_rendered.connect(template_finished, app)
+
+# DICTIONARY_PROFILE_DIR=<dir> writes a cProfile dump of every request there
+if os.environ.get('DICTIONARY_PROFILE_DIR'):
+    from werkzeug.middleware.profiler import ProfilerMiddleware
+    os.makedirs(os.environ['DICTIONARY_PROFILE_DIR'], exist_ok=True)
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, stream=None, profile_dir=os.environ['DICTIONARY_PROFILE_DIR'])
+
+# pages are rendered once per dictionary version (see page_cache.py)
+pages = PageCache(store)
+
+# the JSON API (see resources/)
 api = Api(app)
+api.add_resource(User, '/api/users', '/api/users/<string:username>')
+api.add_resource(Word, '/api/words/<string:word>', resource_class_kwargs={'store': store})
+api.add_resource(WordList, '/api/words', resource_class_kwargs={'store': store})
 
 @app.route('/')
+@pages.cached
 def home():
     # if not session.get('logged_in'):
     #     return render_template('login.html')
     # else:
-    my_dict = pd.read_csv(path_to_dict)
-    num_words = len(my_dict)
+    num_words = len(store)
     return render_template('home.html', **locals())
 
+# logging in with a new username signs it up; an existing one must match
 @app.route('/login', methods=['POST'])
 def user_login():
-    insert_user(request.form['username'], request.form['password'])
-    users = retrieve_users()
+    username, password = request.form['username'], request.form['password']
+    if retrieve_user(username) is None:
+        insert_user(username, password)
+    elif not check_password(username, password):
+        abort(401)
     return home()
 
 @app.route('/study')
 def study():
-    my_dict = pd.read_csv(path_to_dict)
-    rand_index = random.randint(0,len(my_dict)-1)
-    word = my_dict.Word[rand_index]
+    word = next_study_word()
     return render_template('study.html', **locals())
 
+# the word whose review is due soonest
+def next_study_word():
+    # a review row can briefly outlive its word when another worker deleted it
+    for _ in range(10):
+        key = scheduler.next_word()
+        if key is None:
+            return None
+        entry = store.get(key)
+        if entry is not None:
+            return entry[0]
+        scheduler.removed(key)
+    return None
+
+# record a study answer: correct=1 / correct=0 from the study buttons, or
+# an SM-2 quality=0..5
+@app.route('/study/<string:word>/answer', methods=['POST'])
+def study_answer(word):
+    if 'quality' in request.form:
+        quality = request.form.get('quality', type=int)
+        if quality is None:
+            abort(400)
+        quality = min(max(quality, 0), 5)
+    else:
+        quality = RIGHT if request.form.get('correct') == '1' else WRONG
+    if scheduler.answer(normalize_word(word), quality) is None:
+        abort(404)
+    return redirect('/study')
+
 @app.route('/add')
 def add():
     return render_template('add.html', **locals())
 
+# Adding a word queues a background job (see data/jobs.py) and answers
+# straight away: with the result if the lookup settled at once (say from
+# the fetch cache), otherwise with a page that follows the job until the
+# word is in. Submitting the same word again joins the job in progress.
 @app.route('/add', methods=['POST'])
 def add_post():
-    word = request.form['word']
-    my_dict = pd.read_csv(path_to_dict)
-
-    if word in set(my_dict.Word.str.lower().values): # if it exists, print the below and quit
-        response_string = "This word already exists in the dictionary!"
-        return render_template('add_response.html', **locals())
-
-    else:
-        client_1 = ("PyDictionary", PyDictionary())
-        apiUrl = 'http://api.wordnik.com/v4'
-        apiKey = '263a2b19c795b9844520302bf530266a76754c313e57a5b2d'
-        client_2 = ("Wordnik", swagger.ApiClient(apiKey, apiUrl))
-
-        clients = dict([client_1, client_2])
-
-        for ctype, client in clients.items():
-            if ctype == 'PyDictionary':
-                defn = client.meaning(word)
-            elif ctype == 'Wordnik':
-                word_api = WordApi.WordApi(client)
-                defn_data = word_api.getDefinitions(word)
-                if defn_data != None:
-                    defn = {}
-                    for dfn in defn_data:
-                        defn[dfn.partOfSpeech] = [dfn.text]
-            if defn in [None, {}]:
-                continue
-            else:
-                break
-
-        if defn in [None, {}]:
-            response_string = 'Could not find a definition for that word :('
-            return render_template('add_response.html', **locals())
-        else:
-            response_string = defn
-
-        new_entry = pd.DataFrame([[word, defn]], columns=my_dict.columns)
-        my_dict = pd.concat([my_dict, new_entry], ignore_index=True)
-        my_dict.sort_values('Word', inplace=True)
-        my_dict.reset_index(drop=True, inplace=True)
-        my_dict.to_csv(path_to_dict, index=False)
-        num_words = len(my_dict)
-        
-        return render_template('add_response.html', **locals())
+    return add_response(jobs.submit(request.form['word']))
 
 @app.route('/add/<string:word>/')
 def add_lookup(word):
-    my_dict = pd.read_csv(path_to_dict)
-    num_words = len(my_dict)
+    return add_response(jobs.submit(word))
 
-    if word in set(my_dict.Word.str.lower().values): # if it exists, print the below and quit
-        response_string = "This word already exists in the dictionary!"
-        return render_template('add_response.html', **locals())
+@app.route('/add/jobs/<string:job_id>')
+def add_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return add_response(job)
+
+@app.route('/add/jobs/<string:job_id>.json')
+def add_job_json(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.as_dict())
 
+def add_response(job):
+    word = job.word
+    num_words = len(store)
+    if job.state == ADDED:
+        response_string = job.definition
+    elif job.state == EXISTS:
+        response_string = "This word already exists in the dictionary!"
+    elif job.state == PENDING:
+        response_string = 'Fetching a definition for that word...'
     else:
-        client_1 = ("PyDictionary", PyDictionary())
-        apiUrl = 'http://api.wordnik.com/v4'
-        apiKey = '263a2b19c795b9844520302bf530266a76754c313e57a5b2d'
-        client_2 = ("Wordnik", swagger.ApiClient(apiKey, apiUrl))
-
-        clients = dict([client_1, client_2])
-
-        for ctype, client in clients.items():
-            if ctype == 'PyDictionary':
-                defn = client.meaning(word)
-            elif ctype == 'Wordnik':
-                word_api = WordApi.WordApi(client)
-                defn_data = word_api.getDefinitions(word)
-                if defn_data != None:
-                    defn = {}
-                    for dfn in defn_data:
-                        defn[dfn.partOfSpeech] = [dfn.text]
-            if defn in [None, {}]:
-                continue
-            else:
-                break
-
-        if defn in [None, {}]:
-            response_string = 'Could not find a definition for that word :('
-            return render_template('add_response.html', **locals())
-        else:
-            response_string = ''
-            for pos, text in defn.items():
-                response_string += pos + '\n'
-                for t in text:
-                    response_string += '\t' + t + '\n'
-
-        new_entry = pd.DataFrame([[word, defn]], columns=my_dict.columns)
-        my_dict = pd.concat([my_dict, new_entry], ignore_index=True)
-        my_dict.sort_values('Word', inplace=True)
-        my_dict.reset_index(drop=True, inplace=True)
-        my_dict.to_csv(path_to_dict, index=False)
-        num_words = len(my_dict)
-        
-        return render_template('add_response.html', **locals())
+        response_string = 'Could not find a definition for that word :('
+    pending = job.state == PENDING
+    if pending:
+        return render_template('add_response.html', **locals()), 202, {'Location': '/add/jobs/%s.json' % job.id}
+    return render_template('add_response.html', **locals())
 
 @app.route('/lookup_word')
+@pages.cached
 def lookup_word():
     return render_template('lookup.html', **locals())
 
 @app.route('/lookup_word', methods=['POST'])
 def lookup_word_post():
     word = request.form['word']
-    my_dict = pd.read_csv(path_to_dict)
-    num_words = len(my_dict)
-    if word.lower() in set(my_dict.Word.str.lower().values):
-        definition = my_dict[my_dict.Word == word]['Definition'].values[0]
-        definition = ast.literal_eval(definition)
+    return pages.respond(('lookup_word_post', word), lambda: lookup_page(word))
+
+def lookup_page(word):
+    num_words = len(store)
+    entry = store.get(word)
+    if entry is not None:
+        definition = entry[1]
         found = True
     else:
         definition = "There is no entry in your dictionary for that word :("
         found = False
+        suggestions = fuzzy.suggest(word)
     return render_template('show_definition.html', **locals())
 
+# autocomplete for the word boxes: ?q=<prefix>&limit=<n> -> JSON list of words
+@app.route('/suggest')
+def suggest():
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    # a blank prefix would match every word
+    prefix = normalize_word(request.args.get('q', ''))
+    return jsonify(store.complete(prefix, limit) if prefix else [])
+
+# words whose definitions match ?q=, optionally only ?pos= senses
+def search_results():
+    query = request.args.get('q', '')
+    pos = request.args.get('pos') or None
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return query, pos, definitions.search(query, pos=pos, limit=limit) if query else []
+
+@app.route('/search')
+@pages.cached
+def search():
+    num_words = len(store)
+    query, pos, results = search_results()
+    parts_of_speech = definitions.parts_of_speech()
+    results = [(word, result_pos, store.get(word)) for word, result_pos, score in results]
+    return render_template('search.html', **locals())
+
+@app.route('/search.json')
+def search_json():
+    query, pos, results = search_results()
+    return jsonify(results=[{'word': word, 'pos': result_pos, 'score': round(score, 4)}
+                            for word, result_pos, score in results])
+
 @app.route('/delete')
 def delete():
     return render_template('delete.html', **locals())
@@ -166,39 +252,112 @@ def delete():
 @app.route('/delete', methods=['POST'])
 def delete_word_post():
     word = request.form['word']
-    my_dict = pd.read_csv(path_to_dict)
-    num_words = len(my_dict)
-    if word in set(my_dict.Word.str.lower().values):
-        my_dict = my_dict[my_dict.Word != word].reset_index(drop=True)
-        my_dict.to_csv(path_to_dict, index=False)
+    num_words = len(store)
+    if store.delete(word):
         definition = 'deleted'
-        num_words = len(my_dict)
+        num_words = len(store)
     else:
         definition = "There is no entry in your dictionary for that word :("
     return render_template('show_definition.html', **locals())
 
+# one page of entries in alphabetical order, starting after the word in
+# ?after= (the cursor), rendered and sent to the client as it goes
+def dict_page():
+    after = request.args.get('after')
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    entries = islice(store.iter_rows(after=normalize_word(after) if after else None, chunk=limit), limit)
+    return entries, limit
+
 @app.route('/print_dict')
+@pages.cached
 def print_dict():
-    my_dict = pd.read_csv(path_to_dict)
-    num_words = len(my_dict)
-    dict_html = my_dict.to_html(justify='left')
-    return render_template('print.html', **locals())
+    num_words = len(store)
+    entries, limit = dict_page()
+    return Response(stream_with_context(stream_template('print.html', **locals())))
+
+@app.route('/print_dict.json')
+def print_dict_json():
+    entries, limit = dict_page()
+    entries = [{'word': word, 'definition': defn} for word, defn in entries]
+    next_after = entries[-1]['word'] if len(entries) == limit else None
+    return jsonify(num_words=len(store), entries=entries, next=next_after)
 
 @app.route('/show_definition/<string:word>/')
+@pages.cached
 def show_definition(word):
-    my_dict = pd.read_csv(path_to_dict)
-    num_words = len(my_dict)
-    definition = my_dict[my_dict.Word == word]['Definition'].values[0]
-    definition = ast.literal_eval(definition)
-    found = True
+    num_words = len(store)
+    entry = store.get(word)
+    if entry is not None:
+        definition = entry[1]
+        found = True
+    else:
+        definition = "There is no entry in your dictionary for that word :("
+        found = False
+        suggestions = fuzzy.suggest(word)
+    studying = found and request.args.get('study') == '1'
     return render_template('show_definition.html', **locals())
 
+@app.route('/export.<any(csv, jsonl):fmt>')
+def export_words(fmt):
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    return Response(stream_with_context(export_rows(store, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename=My_Dictionary.' + fmt})
+
+# POST a file (as the 'file' form field or the raw body) in ?format=csv,
+# jsonl or txt (one word per line); rows without a definition are fetched,
+# and rows that cannot be read are counted as invalid. An upload that is
+# not in the format at all gets a 400, with what was imported before that
+# was found out.
+@app.route('/import', methods=['POST'])
+def import_words():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        abort(400)
+    upload = request.files['file'].stream if 'file' in request.files else request.stream
+    lines = io.TextIOWrapper(upload, encoding='utf-8')
+    try:
+        return jsonify(import_rows(store, read_rows(lines, fmt), providers))
+    except MalformedUpload as exc:
+        return jsonify(error=str(exc), **exc.stats), 400
+
+@app.cli.command('export-words')
+@click.argument('output', type=click.File('w'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+def export_words_command(output, fmt):
+    for chunk in export_rows(store, fmt):
+        output.write(chunk)
+
+@app.cli.command('import-words')
+@click.argument('input', type=click.File('r'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv')
+@click.option('--batch-size', default=500)
+def import_words_command(input, fmt, batch_size):
+    try:
+        click.echo(import_rows(store, read_rows(input, fmt), providers, batch_size=batch_size))
+    except MalformedUpload as exc:
+        raise click.ClickException('%s (imported before that: %s)' % (exc, exc.stats))
+
+@app.route('/metrics')
+def metrics_page():
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/logout')
 def logout():
     session['logged_in'] = False
     flash('You are logged out.')
     return home()
 
+# how long this process took to boot, phase by phase, and what a fresh
+# import of the app spends its time importing
+@app.cli.command('startup-report')
+@click.option('--top', default=15, help="how many modules to list")
+def startup_report_command(top):
+    click.echo(startup_report(boot, 'app', top=top, cwd=os.path.dirname(os.path.abspath(__file__))))
+
+boot.mark('app')
+
 if __name__ == '__main__':
     app.secret_key = os.urandom(12)
     app.run(debug=True)
\ No newline at end of file
@@ -17,9 +17,11 @@ import ast
 def write_dictionary_to_file(d):
     d.to_csv('My_Dictionary.csv', index=False)
 
-# read a dictionary from CSV
+# read a dictionary from CSV, parsing each definition once up front
 def read_dictionary_from_file():
-    return(pd.read_csv('My_Dictionary.csv'))
+    d = pd.read_csv('My_Dictionary.csv')
+    d['Definition'] = d.Definition.map(ast.literal_eval)
+    return(d)
 
 # # edit a definition
 # def edit_definition(d):
@@ -34,8 +36,8 @@ def read_dictionary_from_file():
 
 # print the definition dict for a word in pretty format
 def print_definition(d, word):
-    defn_str = d[d.Word == word]['Definition'].values[0]
-    for pos, defn_list in ast.literal_eval(defn_str).items():
+    defn = d[d.Word == word]['Definition'].values[0]
+    for pos, defn_list in defn.items():
         print("    ", pos + ":")
         for defn in defn_list:
             print("      ", defn, "\n")
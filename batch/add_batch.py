@@ -1,76 +1,84 @@
-from PyDictionary import PyDictionary
-from wordnik import *
-import pandas as pd
-import ast
+import argparse
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-# write a dictionary to CSV
-def write_dictionary_to_file(d):
-    d.to_csv('../data/My_Dictionary.csv', index=False)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from data.journal import MutationLog
+from data.store import open_store
+from data.fetch_cache import FetchCache
+from providers import create_registry
 
-# read a dictionary from CSV
-def read_dictionary_from_file():
-    return(pd.read_csv('../data/My_Dictionary.csv'))
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
 
-def delete_card(d, word):
-    #print("Words:", len(d), ">>", len(d[d.Word != word]))
-    d = d[d.Word != word].reset_index(drop=True)
-    write_dictionary_to_file(d)
-    return(d)
+def read_checkpoint(checkpoint):
+    done = {}
+    checkpoint.repair()
+    for record, _ in checkpoint.replay():
+        done[record['word']] = record['definition']
+    return done
 
-def add_card(d, clients, word):
-	# what if the word already exists in the dictionary?!
-	if word in set(d.Word.values): # if it exists, print the below and quit
-	    print("This word already exists in the dictionary!")
-	    return(d)
+# Re-fetch every word's definition through a bounded pool of `workers`.
+# Each result is appended to `checkpoint` as it comes in, so an interrupted
+# run picks up where it left off; the store is written once, at the end.
+# Words no provider knows keep the definition they had.
+def refresh(store, providers, checkpoint, workers=8):
+    word_list = [word for word, _ in store.rows()]
+    done = read_checkpoint(checkpoint)
+    todo = [word for word in word_list if word not in done]
+    print("Words in Dict:", len(word_list), "| already refreshed:", len(done), "| to fetch:", len(todo))
 
-	else:
-	    for ctype, client in clients.items():
-	        if ctype == 'PyDictionary':
-	            defn = client.meaning(word)
-	        elif ctype == 'Wordnik':
-	            word_api = WordApi.WordApi(client)
-	            defn_data = word_api.getDefinitions(word)
-	            if defn_data is not None:
-	                defn = {}
-	                for dfn in defn_data:
-	                    defn[dfn.partOfSpeech] = [dfn.text]
-	        if defn in [None, {}] and ctype == 'Wordnik':
-	            print("\nWord not found in these clients:", [d for d in clients.keys()], "\n")
-	            return(d)
-	        if defn in [None, {}]:
-	            continue
-	        else:
-	            break
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        todo = iter(todo)
+        while True:
+            # keep at most two fetches per worker queued
+            for word in todo:
+                in_flight[pool.submit(providers.fetch, word)] = word
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            results = []
+            for future in finished:
+                word = in_flight.pop(future)
+                done[word] = future.result()
+                results.append({'word': word, 'definition': done[word]})
+                if done[word] is None:
+                    print("Word not found in these providers:", [p.name for p in providers.providers], word)
+            checkpoint.append(results)
 
-	    print("Adding word:", word)
-	    print("Definition:", defn)
+    store.replace([(word, defn) for word, defn in done.items() if defn is not None and word in store])
+    ## fold the change log away once at the end
+    store.compact()
+    checkpoint.truncate()
+    return len(done)
 
-	    new_entry = pd.DataFrame([[word, defn]], columns=d.columns)
-	    d = pd.concat([d, new_entry], ignore_index=True)
-	    d.sort_values('Word', inplace=True)
-	    d.reset_index(drop=True, inplace=True)
+def main():
+    parser = argparse.ArgumentParser(description="Re-fetch the definition of every word in the dictionary.")
+    parser.add_argument('--dictionary', default=os.environ.get('DICTIONARY_PATH', os.path.join(data_dir, 'My_Dictionary.csv')))
+    parser.add_argument('--workers', type=int, default=8, help="concurrent lookups")
+    parser.add_argument('--checkpoint',
+                        help="progress file; rerun with the same one to resume "
+                             "(default: <dictionary>.refresh.checkpoint, next to the dictionary)")
+    parser.add_argument('--no-cache', action='store_true', help="ignore previously fetched definitions")
+    args = parser.parse_args()
+    ## a checkpoint holds one dictionary's fetched definitions, so each
+    ## dictionary resumes from its own
+    checkpoint = args.checkpoint or os.path.splitext(args.dictionary)[0] + '.refresh.checkpoint'
 
-	    write_dictionary_to_file(d)
-	    return(d)
-	    
+    ## one registry for the whole run: long-lived clients on a pooled HTTP
+    ## session, and words fetched before (or known to be missing) answered
+    ## from the cache; it is sized for --workers lookups at once
+    cache = None if args.no_cache else FetchCache(os.path.join(data_dir, 'fetch_cache.db'))
+    providers = create_registry(cache=cache, workers=args.workers)
+    store = open_store(args.dictionary)
 
-client_1 = ("PyDictionary", PyDictionary())
-## init word api 2
-apiUrl = 'http://api.wordnik.com/v4'
-apiKey = '263a2b19c795b9844520302bf530266a76754c313e57a5b2d'
-client_2 = ("Wordnik", swagger.ApiClient(apiKey, apiUrl))
+    refresh(store, providers, MutationLog(checkpoint), workers=args.workers)
+    providers.close()
 
-clients = dict([client_1, client_2])
+    print("DONE. Words in Dict:", len(store))
 
-## get list of all words in the dictionary
-d = read_dictionary_from_file()
-word_list = d.Word
-
-print("Words in Dict:", len(d))
-
-## for each word, delete the word and then call add_card()
-for word in word_list:
-	d = delete_card(d, word)
-	d = add_card(d, clients, word)
-
-print("DONE. Words in Dict:", len(d))
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""Benchmarks for the app's routes and storage, as JSON.
+
+    python bench/run.py --sizes 1000,10000,100000 --requests 200 --output bench.json
+
+For each size a synthetic dictionary of that many words is generated (in
+the Word,Definition CSV layout, kept under --work-dir and reused on later
+runs with the same size and seed). Each run copies it into a scratch
+directory of its own, since the routes' writes append to its log and
+compact it, and a fresh process imports app.py against the copy and
+drives every route through Flask's test client, with providers replaced
+by a local StaticProvider so no request leaves the machine. Per route it
+reports p50/p99/mean latency in milliseconds and requests per second;
+per size, the app's startup time (loading the store and building its
+indexes) and the peak RSS of the process.
+
+Startup is always measured warm: the copy's binary snapshot (see
+data/snapshot.py) is written before the app starts, as it would be
+on any restart after the first, so startup_s never includes parsing the
+CSV.
+
+Every run uses the same seed, so two runs on one machine are comparable.
+"""
+
+import argparse
+import base64
+import csv
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from data.definitions import dump_definition
+from data.store import CsvBackend
+
+BENCH_AUTH = 'Basic ' + base64.b64encode(b'bench0:x').decode('ascii')
+SYLLABLES = [c + v for c in 'bdfgklmnprstv' for v in 'aeiou'][:64]
+PARTS_OF_SPEECH = ['Noun', 'Verb', 'Adjective', 'Adverb']
+
+
+# the i-th synthetic word; distinct for distinct i. Words never contain
+# 'z', so 'z' + word is a word that is not in the dictionary.
+def word_for(i, width=3):
+    syllables = []
+    for _ in range(width):
+        i, digit = divmod(i, len(SYLLABLES))
+        syllables.append(SYLLABLES[digit])
+    return ''.join(syllables)
+
+
+def width_for(size):
+    width = 3
+    while len(SYLLABLES) ** width < size:
+        width += 1
+    return width
+
+
+def definition_for(rng, vocabulary):
+    defn = {}
+    for pos in rng.sample(PARTS_OF_SPEECH, rng.randint(1, 2)):
+        defn[pos] = [' '.join(rng.sample(vocabulary, rng.randint(5, 12))) for _ in range(rng.randint(1, 3))]
+    return defn
+
+
+def vocabulary(seed):
+    rng = random.Random(seed)
+    return [word_for(rng.randrange(10 ** 6), 2) for _ in range(2000)]
+
+
+# write a `size`-word dictionary to `path`, in alphabetical order like a
+# compacted snapshot
+def generate(path, size, seed=0):
+    rng = random.Random(seed)
+    vocab = vocabulary(seed)
+    width = width_for(size)
+    words = sorted(word_for(i, width) for i in range(size))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['Word', 'Definition'])
+        for word in words:
+            writer.writerow([word, dump_definition(definition_for(rng, vocab))])
+    os.replace(tmp_path, path)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    total = sum(timings)
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'mean_ms': round(total / len(timings) * 1000, 3),
+        'rps': round(len(timings) / total, 1) if total else None,
+    }
+
+
+# The routes, each as (name, share of --requests, request(i) -> (method,
+# url, options for the test client)). `known` and `missing` are words that
+# are / are not in the dictionary.
+def scenarios(known, missing, vocab):
+    def pick(words, i):
+        return words[i % len(words)]
+
+    return [
+        ('GET /', 1, lambda i: ('GET', '/', {})),
+        ('GET /study', 1, lambda i: ('GET', '/study', {})),
+        ('POST /study/<word>/answer', 1,
+         lambda i: ('POST', '/study/%s/answer' % pick(known, i), {'data': {'correct': str(i % 2)}})),
+        ('GET /lookup_word', 1, lambda i: ('GET', '/lookup_word', {})),
+        ('POST /lookup_word', 1, lambda i: ('POST', '/lookup_word', {'data': {'word': pick(known, i)}})),
+        ('POST /lookup_word (miss)', 1, lambda i: ('POST', '/lookup_word', {'data': {'word': pick(missing, i)}})),
+        ('GET /show_definition/<word>/', 1, lambda i: ('GET', '/show_definition/%s/' % pick(known, i), {})),
+        ('GET /show_definition/<word>/ (miss)', 1,
+         lambda i: ('GET', '/show_definition/%s/' % pick(missing, i), {})),
+        ('GET /suggest', 1, lambda i: ('GET', '/suggest?q=' + pick(known, i)[:3], {})),
+        ('GET /search', 1, lambda i: ('GET', '/search?q=' + pick(vocab, i), {})),
+        ('GET /search.json', 1, lambda i: ('GET', '/search.json?q=' + pick(vocab, i), {})),
+        ('GET /print_dict', 1, lambda i: ('GET', '/print_dict?after=' + pick(known, i), {})),
+        ('GET /print_dict.json', 1, lambda i: ('GET', '/print_dict.json?after=' + pick(known, i), {})),
+        ('GET /add', 1, lambda i: ('GET', '/add', {})),
+        ('POST /add', 1, lambda i: ('POST', '/add', {'data': {'word': 'z' + pick(known, i)}})),
+        ('GET /add/<word>/', 1, lambda i: ('GET', '/add/%s/' % pick(known, i), {})),
+        ('GET /delete', 1, lambda i: ('GET', '/delete', {})),
+        ('POST /delete', 1, lambda i: ('POST', '/delete', {'data': {'word': 'z' + pick(known, i)}})),
+        ('GET /api/words/<word>', 1, lambda i: ('GET', '/api/words/' + pick(known, i), {})),
+        ('GET /api/words?word=...', 1,
+         lambda i: ('GET', '/api/words?word=' + ','.join(pick(known, i + j) for j in range(10)), {})),
+        ('PUT /api/words/<word>', 1,
+         lambda i: ('PUT', '/api/words/y' + pick(known, i), {'json': {'definition': {'Noun': ['bench']}}})),
+        ('DELETE /api/words/<word>', 1, lambda i: ('DELETE', '/api/words/y' + pick(known, i), {})),
+        ('POST /import', 0.1,
+         lambda i: ('POST', '/import?format=txt', {'data': '\n'.join('x%d' % (i * 10 + j) + pick(known, j)
+                                                                     for j in range(10))})),
+        ('GET /export.csv', 0.02, lambda i: ('GET', '/export.csv', {})),
+        ('GET /export.jsonl', 0.02, lambda i: ('GET', '/export.jsonl', {})),
+        ('POST /login', 0.1, lambda i: ('POST', '/login', {'data': {'username': 'bench%d' % i, 'password': 'x'}})),
+        # signed in as the first user POST /login made
+        ('GET /api/users', 1, lambda i: ('GET', '/api/users', {'headers': {'Authorization': BENCH_AUTH}})),
+        ('GET /logout', 1, lambda i: ('GET', '/logout', {})),
+    ]
+
+
+# run in a fresh process per size: import the app against `dictionary`
+# and time every route
+def measure(dictionary, size, requests, seed):
+    # importing the app loads the store and builds its indexes
+    started = time.perf_counter()
+    import app as appmod
+    from providers import StaticProvider
+    started_up = time.perf_counter()
+
+    width = width_for(size)
+    rng = random.Random(seed)
+    known = [word_for(rng.randrange(size), width) for _ in range(1000)]
+    missing = ['z' + word for word in known]
+    vocab = vocabulary(seed)
+    stub = dict((word, {'Noun': ['a benchmark word']}) for word in missing)
+    appmod.providers.providers = [StaticProvider('bench', stub)]
+    appmod.providers.cache = None
+    appmod.app.secret_key = 'bench'
+    client = appmod.app.test_client()
+
+    routes = {}
+    for name, share, make in scenarios(known, missing, vocab):
+        timings = []
+        for i in range(max(1, int(requests * share))):
+            method, url, options = make(i)
+            start = time.perf_counter()
+            response = client.open(url, method=method, **options)
+            response.get_data()
+            timings.append(time.perf_counter() - start)
+            if response.status_code >= 500:
+                raise RuntimeError('%s %s -> %s' % (method, url, response.status_code))
+        routes[name] = summarize(timings)
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+    return {
+        'size': size,
+        'startup_s': round(started_up - started, 3),
+        'peak_rss_mb': round(peak_rss / 2.0 ** 20, 1),
+        'routes': routes,
+    }
+
+
+def run_size(size, args):
+    generated = os.path.join(args.work_dir, 'bench_%d_%d.csv' % (size, args.seed))
+    if not os.path.exists(generated):
+        generate(generated, size, args.seed)
+    # the generated dictionary is never written to: each run gets a copy,
+    # with no log, study data or users, and its snapshot already written
+    scratch = tempfile.mkdtemp(dir=args.work_dir)
+    try:
+        dictionary = os.path.join(scratch, 'dictionary.csv')
+        shutil.copyfile(generated, dictionary)
+        CsvBackend(dictionary).load()
+        env = dict(os.environ, DICTIONARY_PATH=dictionary,
+                   USERS_PATH=os.path.join(scratch, 'users.db'),
+                   FETCH_CACHE_PATH=os.path.join(scratch, 'fetch_cache.db'))
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--measure', dictionary, '--size', str(size),
+             '--requests', str(args.requests), '--seed', str(args.seed)],
+            env=env, cwd=ROOT)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    # the measurement is the last line; anything the app printed comes first
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's routes on synthetic dictionaries.")
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                        help="comma-separated dictionary sizes")
+    parser.add_argument('--requests', type=int, default=200, help="requests per route")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'dictionaryy-bench'),
+                        help="where generated dictionaries are kept")
+    parser.add_argument('--output', help="write the results here instead of stdout")
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.size, args.requests, args.seed)))
+        return
+
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+    results = {
+        'python': sys.version.split()[0],
+        'requests': args.requests,
+        'seed': args.seed,
+        'runs': [run_size(int(size), args) for size in args.sizes.split(',')],
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
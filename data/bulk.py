@@ -0,0 +1,155 @@
+"""Bulk import and export of dictionary entries.
+
+Exports stream the store row by row as CSV (the Word,Definition layout of
+My_Dictionary.csv, definitions as JSON) or JSON Lines
+({"word": ..., "definition": {...}}). Imports read the same formats, or a
+bare word list, one row at a time and commit in batches, so neither
+direction ever holds the whole dictionary or the whole upload in memory.
+A row that cannot be read is counted as invalid and the import carries
+on; only an upload that is not in the format at all is refused, with
+MalformedUpload.
+"""
+
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from data.definitions import dump_definition, parse_definition
+from data.store import COLUMNS
+
+FORMATS = ('csv', 'jsonl', 'txt')
+
+# what a reader yields for a row it could not make sense of
+INVALID = (None, None)
+
+
+class MalformedUpload(ValueError):
+    """An upload that cannot be read as its format at all. `stats` holds
+    what was imported before it was found out."""
+
+    def __init__(self, message):
+        super(MalformedUpload, self).__init__(message)
+        self.stats = None
+
+
+def _csv_line(row):
+    out = io.StringIO()
+    csv.writer(out, lineterminator='\n').writerow(row)
+    return out.getvalue()
+
+
+def export_csv(store):
+    yield _csv_line(COLUMNS)
+    for word, defn in store.iter_rows():
+        yield _csv_line([word, dump_definition(defn)])
+
+
+def export_jsonl(store):
+    for word, defn in store.iter_rows():
+        yield json.dumps({'word': word, 'definition': defn}, ensure_ascii=False) + '\n'
+
+
+def export_rows(store, fmt):
+    return export_jsonl(store) if fmt == 'jsonl' else export_csv(store)
+
+
+# Readers turn lines of text into (word, definition) pairs; the
+# definition is None for rows that only name a word, and rows that cannot
+# be read come out as INVALID.
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None or 'Word' not in reader.fieldnames:
+        raise MalformedUpload("a CSV import needs a header row with a Word column")
+    for row in reader:
+        word = (row.get('Word') or '').strip()
+        if word:
+            yield word, (row.get('Definition') or '').strip() or None
+        else:
+            yield INVALID
+
+
+def read_jsonl(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield INVALID
+                continue
+            if isinstance(row, str):
+                row = {'word': row}
+            word = row.get('word') if isinstance(row, dict) else None
+            if isinstance(word, str) and word.strip():
+                yield word, row.get('definition') or None
+            else:
+                yield INVALID
+
+
+def read_words(lines):
+    for line in lines:
+        word = line.strip()
+        if word:
+            yield word, None
+
+
+def read_rows(lines, fmt):
+    try:
+        for row in {'csv': read_csv, 'jsonl': read_jsonl, 'txt': read_words}[fmt](lines):
+            yield row
+    except UnicodeDecodeError:
+        raise MalformedUpload("an import must be UTF-8 text")
+
+
+# `row` with its definition parsed, or INVALID
+def _checked(row):
+    word, defn = row
+    if word is None or defn is None:
+        return row
+    try:
+        return word, parse_definition(defn)
+    except (ValueError, SyntaxError, TypeError, AttributeError):
+        return INVALID
+
+
+# Add `rows` to the store `batch_size` at a time. Words already in the
+# store are skipped; words without a definition are looked up through
+# `providers` (a ProviderRegistry), `workers` at a time, and counted as
+# missing when nobody has one; rows that cannot be read, or whose
+# definition cannot be parsed, are counted as invalid. Returns counts of
+# what happened.
+def import_rows(store, rows, providers=None, batch_size=500, workers=8):
+    stats = {'added': 0, 'skipped': 0, 'missing': 0, 'invalid': 0}
+    try:
+        _import(store, iter(rows), providers, batch_size, workers, stats)
+    except MalformedUpload as exc:
+        exc.stats = stats
+        raise
+    return stats
+
+
+def _import(store, rows, providers, batch_size, workers, stats):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = [_checked(row) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            valid = [row for row in batch if row[0] is not None]
+            stats['invalid'] += len(batch) - len(valid)
+            new = [(word, defn) for word, defn in valid if word not in store]
+            stats['skipped'] += len(valid) - len(new)
+            lookups = list(dict.fromkeys(word for word, defn in new if defn is None))
+            if lookups:
+                if providers is None:
+                    fetched = dict((word, None) for word in lookups)
+                else:
+                    fetched = dict(zip(lookups, pool.map(providers.fetch, lookups)))
+                new = [(word, defn if defn is not None else fetched[word]) for word, defn in new]
+            found = [(word, defn) for word, defn in new if defn is not None]
+            stats['missing'] += len(new) - len(found)
+            added = store.add_many(found)
+            stats['added'] += len(added)
+            stats['skipped'] += len(found) - len(added)
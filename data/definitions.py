@@ -0,0 +1,36 @@
+"""Structured definitions.
+
+A definition is a dict of part of speech -> list of senses, e.g.
+{'Noun': ['a state or condition markedly different from the norm']}.
+It is parsed once, when the dictionary is loaded or a word is added, and
+kept in that form so rendering a page never has to parse anything.
+"""
+
+import ast
+import json
+from collections import namedtuple
+
+# what the store holds for each word: the word as it was entered and its
+# parsed definition. A tuple underneath, so no per-record __dict__.
+Entry = namedtuple('Entry', ['word', 'definition'])
+
+
+# accepts an already structured definition, the JSON text this package
+# writes, or the stringified Python dict older CSVs and logs hold
+def parse_definition(value):
+    if isinstance(value, dict):
+        defn = value
+    else:
+        value = value.strip()
+        try:
+            defn = json.loads(value)
+        except ValueError:
+            # legacy My_Dictionary.csv format, e.g. "{'Noun': ['...']}"
+            defn = ast.literal_eval(value)
+    if not isinstance(defn, dict) or not all(isinstance(s, (list, tuple)) for s in defn.values()):
+        raise ValueError('a definition must map parts of speech to lists of senses')
+    return dict((str(pos), [str(s) for s in senses]) for pos, senses in defn.items())
+
+
+def dump_definition(defn):
+    return json.dumps(defn, ensure_ascii=False)
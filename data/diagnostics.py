@@ -0,0 +1,76 @@
+"""Startup diagnostics.
+
+BootTimer times the phases of the app's own startup as they happen
+(reported as boot.<phase> spans when metrics are on, see data/metrics.py).
+import_times() asks a fresh interpreter to import a module under
+`python -X importtime` and parses what it reports, so the startup report
+shows which imports the boot is actually paying for:
+
+    flask --app app startup-report
+"""
+
+import os
+import sys
+import time
+
+from data import metrics
+
+
+class BootTimer(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []
+
+    # the time since the previous mark was spent on `phase`
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        metrics.observe('boot.' + phase, now - self._last)
+        self._last = now
+
+    def total(self):
+        return self._last - self.started
+
+
+# (module, self seconds, cumulative seconds, depth) for `module` and every
+# module importing it loads, as python -X importtime lists them in a fresh
+# interpreter: each module after the ones it imported, `module` last.
+# Whatever the interpreter loads for itself before that is left out.
+def import_times(module, cwd=None):
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=cwd,
+                            env=os.environ, universal_newlines=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+        if depth == 0:
+            if name.strip() == module:
+                return times
+            times = []
+    return times
+
+
+def startup_report(boot, module, top=25, cwd=None):
+    lines = ['Boot phases (this process), %.1f ms in all:' % (boot.total() * 1000)]
+    for phase, seconds in boot.phases:
+        lines.append('  %-12s %9.1f ms' % (phase, seconds * 1000))
+
+    times = import_times(module, cwd=cwd)
+    total = times[-1][2] if times else 0.0
+    lines.append('')
+    lines.append('Imports for a fresh `import %s` (python -X importtime), %.1f ms in all.' % (module, total * 1000))
+    lines.append('What %s imports directly, slowest first:' % module)
+    direct = [t for t in times if t[3] == 1]
+    for name, self_s, cumulative, _ in sorted(direct, key=lambda t: -t[2])[:top]:
+        lines.append('  %9.1f ms  %s' % (cumulative * 1000, name))
+    lines.append('Slowest single modules (own time only):')
+    for name, self_s, cumulative, _ in sorted(times, key=lambda t: -t[1])[:top]:
+        lines.append('  %9.1f ms  %s' % (self_s * 1000, name))
+    return '\n'.join(lines)
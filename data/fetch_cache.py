@@ -0,0 +1,86 @@
+import json
+import time
+
+from data import metrics
+from data.pool import ConnectionPool
+from data.store import normalize_word
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetches (
+    word TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    definition TEXT,
+    fetched_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (word, provider)
+);
+CREATE INDEX IF NOT EXISTS fetches_used_at ON fetches (used_at);
+"""
+
+DAY = 24 * 60 * 60
+
+# returned by get() when there is nothing usable cached
+MISS = object()
+
+
+class FetchCache(object):
+    """On-disk cache of what each provider said about each word.
+
+    Keyed by normalized word and provider name. Misses are cached too (as a
+    NULL definition), with their own shorter `negative_ttl`, so a word no
+    provider knows is not looked up again on every attempt. Entries older
+    than their TTL are ignored, and once the table grows past `max_entries`
+    the least recently used rows are evicted.
+    """
+
+    def __init__(self, path, ttl=30 * DAY, negative_ttl=DAY, max_entries=20000,
+                 touch_interval=60.0):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # a hit only rewrites used_at when it is at least this stale, so
+        # reads do not turn into a write each time
+        self.touch_interval = touch_interval
+        self.pool = ConnectionPool(path)
+        self.pool.connection().executescript(SCHEMA)
+        self._puts = 0
+
+    # the cached definition, None for a cached miss, or MISS
+    def get(self, word, provider):
+        key = (normalize_word(word), provider)
+        con = self.pool.connection()
+        row = con.execute('SELECT definition, fetched_at, used_at FROM fetches WHERE word = ? AND provider = ?',
+                          key).fetchone()
+        if row is None:
+            metrics.count('fetch_cache.miss')
+            return MISS
+        definition, fetched_at, used_at = row
+        now = time.time()
+        if now - fetched_at > (self.ttl if definition is not None else self.negative_ttl):
+            metrics.count('fetch_cache.expired')
+            return MISS
+        metrics.count('fetch_cache.hit')
+        if now - used_at > self.touch_interval:
+            con.execute('UPDATE fetches SET used_at = ? WHERE word = ? AND provider = ?', (now,) + key)
+        return json.loads(definition) if definition is not None else None
+
+    def put(self, word, provider, definition):
+        now = time.time()
+        with self.pool.transaction() as con:
+            con.execute('INSERT OR REPLACE INTO fetches VALUES (?, ?, ?, ?, ?)',
+                        (normalize_word(word), provider,
+                         json.dumps(definition) if definition else None, now, now))
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        with self.pool.transaction() as con:
+            excess = con.execute('SELECT COUNT(*) FROM fetches').fetchone()[0] - self.max_entries
+            if excess > 0:
+                con.execute('DELETE FROM fetches WHERE rowid IN '
+                            '(SELECT rowid FROM fetches ORDER BY used_at LIMIT ?)', (excess,))
+
+    def clear(self):
+        with self.pool.transaction() as con:
+            con.execute('DELETE FROM fetches')
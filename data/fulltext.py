@@ -0,0 +1,126 @@
+"""Full-text search over definitions.
+
+Every (word, part of speech) pair is a document made of that part of
+speech's senses. An inverted index maps each term to the documents using
+it and how often, and queries are ranked with BM25. The index is built
+on the first query after the store loads, without holding up the store's
+writers (see data/indexing.py), and then follows its adds and deletes.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+
+from data.indexing import LazyIndex
+
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset('a an and as at be by for from in into is it of on or that the to with'.split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Postings(object):
+    """The inverted index itself. Documents are numbered, so a posting list
+    is a dict of ints, which the garbage collector never has to walk."""
+
+    def __init__(self):
+        self.postings = {}        # term -> {document id: term frequency}
+        self.documents = {}       # document id -> (key, pos, number of terms)
+        self.docs = {}            # key -> {pos: (document id, terms)}
+        self.words = {}           # key -> stored word
+        self.pos_counts = Counter()  # lowercased part of speech -> documents
+        self.total_length = 0
+        self._next_id = 0
+
+    def index(self, key, entry):
+        docs = {}
+        for pos, senses in entry[1].items():
+            terms = Counter(tokenize(' '.join(senses)))
+            doc_id = self._next_id
+            self._next_id += 1
+            for term, tf in terms.items():
+                docs_with_term = self.postings.get(term)
+                if docs_with_term is None:
+                    docs_with_term = self.postings[term] = {}
+                docs_with_term[doc_id] = tf
+            length = sum(terms.values())
+            self.documents[doc_id] = (key, pos, length)
+            docs[pos] = (doc_id, tuple(terms))
+            self.pos_counts[pos.lower()] += 1
+            self.total_length += length
+        self.docs[key] = docs
+        self.words[key] = entry[0]
+
+    def unindex(self, key):
+        for pos, (doc_id, terms) in self.docs.pop(key, {}).items():
+            for term in terms:
+                docs = self.postings[term]
+                del docs[doc_id]
+                if not docs:
+                    del self.postings[term]
+            self.pos_counts[pos.lower()] -= 1
+            self.total_length -= self.documents.pop(doc_id)[2]
+        self.words.pop(key, None)
+
+
+class DefinitionIndex(LazyIndex):
+    """BM25-ranked inverted index over a DictionaryStore's definitions.
+
+    Subscribe it to the store (store.subscribe(index)) to keep it current.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        super(DefinitionIndex, self).__init__()
+        self.k1 = k1
+        self.b = b
+
+    def _build(self, entries):
+        index = Postings()
+        for key, entry in entries.items() if entries is not None else ():
+            index.index(key, entry)
+        return index
+
+    def _add(self, index, key, entry):
+        index.unindex(key)
+        index.index(key, entry)
+
+    def _remove(self, index, key):
+        index.unindex(key)
+
+    # the parts of speech in use, for filtering
+    def parts_of_speech(self):
+        with self._built() as index:
+            return sorted(pos for pos, count in index.pos_counts.items() if count > 0)
+
+    # up to `limit` (word, part of speech, score) results for `query`, best
+    # first, optionally only from senses of part of speech `pos`
+    def search(self, query, pos=None, limit=20):
+        pos = pos.lower() if pos else None
+        scores = {}
+        with self._built() as index:
+            doc_count = len(index.documents)
+            if not doc_count:
+                return []
+            avg_length = index.total_length / float(doc_count)
+            for term in set(tokenize(query)):
+                docs = index.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    key, doc_pos, length = index.documents[doc_id]
+                    if pos is not None and doc_pos.lower() != pos:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    doc = (key, doc_pos)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            # a word ranks by its best-matching part of speech
+            best = {}
+            for (key, doc_pos), score in scores.items():
+                if key not in best or score > best[key][1]:
+                    best[key] = (doc_pos, score)
+            top = heapq.nlargest(limit, best.items(), key=lambda item: item[1][1])
+            return [(index.words[key], doc_pos, score) for key, (doc_pos, score) in top]
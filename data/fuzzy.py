@@ -0,0 +1,117 @@
+"""Fuzzy "did you mean" matching over the dictionary's words.
+
+A trigram inverted index (trigram -> words containing it) narrows a query
+down to the words sharing the most trigrams with it, and only those few
+candidates get an edit-distance check. One edit changes at most three of a
+word's trigrams, so a word within d edits of the query contains at least
+one of any 3d + 1 of the query's trigrams: candidates are gathered from
+the postings of the rarest 3d + 1 only, and the common ones (the padded
+first letter, say, shared by a 26th of the dictionary) are never walked,
+just checked against each candidate. Walking stops at `max_scanned` keys,
+so a lookup costs the length of a few short postings at most, not a share
+of the dictionary, however large it grows. The index is only
+built on the first lookup, so a store that is never asked for suggestions
+never pays for it, and it is built without holding up the store's writers
+(see data/indexing.py).
+"""
+
+from collections import Counter, defaultdict
+from itertools import islice
+
+from data.indexing import LazyIndex
+from data.store import normalize_word
+
+
+_NONE = frozenset()
+
+
+def trigrams(key):
+    padded = '  ' + key + ' '
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+# Levenshtein distance between a and b, giving up (returning
+# max_distance + 1) as soon as it must exceed max_distance
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyIndex(LazyIndex):
+    """Trigram index over a DictionaryStore's words.
+
+    Subscribe it to the store (store.subscribe(index)) to keep it current;
+    suggest() returns the nearest stored words to a misspelt one.
+    """
+
+    def __init__(self, max_candidates=50, max_scanned=5000):
+        super(FuzzyIndex, self).__init__()
+        self.max_candidates = max_candidates
+        # most posted keys a lookup gathers candidates from, so a query with
+        # no rare trigram costs no more than one with a few
+        self.max_scanned = max_scanned
+
+    # the index is (trigram -> keys, key -> stored word)
+    def _build(self, entries):
+        postings = defaultdict(set)
+        words = {}
+        for key, word in entries.words() if entries is not None else ():
+            for gram in trigrams(key):
+                postings[gram].add(key)
+            words[key] = word
+        return postings, words
+
+    def _add(self, index, key, entry):
+        postings, words = index
+        for gram in trigrams(key):
+            postings[gram].add(key)
+        words[key] = entry[0]
+
+    def _remove(self, index, key):
+        postings, words = index
+        for gram in trigrams(key):
+            keys = postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del postings[gram]
+        words.pop(key, None)
+
+    # up to `limit` stored words within `max_distance` edits of `word`
+    # (by default 1 for short words, 2 otherwise), nearest first
+    def suggest(self, word, limit=5, max_distance=None):
+        key = normalize_word(word)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = 1 if len(key) <= 4 else 2
+        rare = 3 * max_distance + 1
+        shared = Counter()
+        with self._built() as (postings, words):
+            lists = sorted((postings.get(gram, _NONE) for gram in trigrams(key)), key=len)
+            for i, keys in enumerate(lists):
+                if i < rare and len(shared) + len(keys) <= self.max_scanned:
+                    shared.update(keys)
+                elif i < rare and not shared:
+                    # too common to walk, with nothing rarer: as many as fit
+                    shared.update(islice(keys, self.max_scanned))
+                else:
+                    # the rest are only checked against the candidates found
+                    shared.update(keys.intersection(shared))
+            candidates = shared.most_common(self.max_candidates)
+            scored = []
+            for candidate, count in candidates:
+                distance = edit_distance(key, candidate, max_distance)
+                if distance <= max_distance and candidate != key:
+                    scored.append((distance, -count, candidate, words[candidate]))
+        scored.sort()
+        return [word for _, _, _, word in scored[:limit]]
@@ -0,0 +1,89 @@
+"""Store listeners whose index is built on first use.
+
+A LazyIndex subscribes to a DictionaryStore (store.subscribe(index)) and
+builds its index from the store's entries the first time it is needed,
+then follows the store's adds and deletes. The build reads the entries
+without holding the index's lock, so the change callbacks, which writers
+make while they hold the store's locks, never wait for it: changes that
+arrive mid-build are queued and replayed onto the new index before it is
+put in place. Callers that need the index meanwhile wait for the build
+rather than start another.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+
+class LazyIndex(object):
+    """Subclasses provide _build(entries) -> index, and _add(index, key,
+    entry) / _remove(index, key) to keep a built index current."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._index = None
+        # while building: (pid, changes queued meanwhile, Event set when done)
+        self._building = None
+
+    # store listener interface
+
+    def reset(self, entries):
+        with self._lock:
+            self._entries = entries
+            self._index = None
+            self._building = None
+
+    def added(self, key, entry):
+        with self._lock:
+            if self._index is not None:
+                self._add(self._index, key, entry)
+            elif self._building is not None:
+                self._building[1].append((key, entry))
+
+    def removed(self, key):
+        with self._lock:
+            if self._index is not None:
+                self._remove(self._index, key)
+            elif self._building is not None:
+                self._building[1].append((key, None))
+
+    # the built index, with the lock held; built first if need be
+    @contextmanager
+    def _built(self):
+        while True:
+            self._lock.acquire()
+            if self._index is not None:
+                break
+            building = self._building
+            # a build started before a fork() has no thread left to finish it
+            if building is None or building[0] != os.getpid():
+                building = self._building = (os.getpid(), [], threading.Event())
+                entries = self._entries
+                self._lock.release()
+                self._run_build(building, entries)
+            else:
+                self._lock.release()
+                building[2].wait()
+        try:
+            yield self._index
+        finally:
+            self._lock.release()
+
+    def _run_build(self, building, entries):
+        index = None
+        try:
+            index = self._build(entries)
+        finally:
+            with self._lock:
+                # unless the store was reloaded meanwhile, which starts over
+                if self._building is building:
+                    if index is not None:
+                        for key, entry in building[1]:
+                            if entry is None:
+                                self._remove(index, key)
+                            else:
+                                self._add(index, key, entry)
+                        self._index = index
+                    self._building = None
+            building[2].set()
@@ -0,0 +1,114 @@
+"""Background "add this word" jobs.
+
+submit() starts looking a word up with the providers and returns a job at
+once. A lookup that settles straight away (say, from the fetch cache) is
+finished there and then, so the job comes back done. Otherwise, when the
+lookup settles, its completion callback hands the job to a single
+finishing thread that adds the word to the store, so no thread sits
+waiting on a lookup, and the store's write locks are never taken on a
+provider's thread or while the lookup holds its own lock.
+Submitting a word that is already being fetched returns the job already
+running for it. Finished jobs are remembered (up to `keep`) so their
+status can still be asked for by id.
+"""
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from data.store import normalize_word
+
+PENDING = 'pending'
+ADDED = 'added'
+EXISTS = 'exists'
+MISSING = 'missing'
+FAILED = 'failed'
+
+
+class AddJob(object):
+    __slots__ = ('id', 'word', 'state', 'definition', 'done')
+
+    def __init__(self, word, state=PENDING):
+        self.id = uuid.uuid4().hex
+        self.word = word
+        self.state = state
+        self.definition = None
+        self.done = threading.Event()
+        if state != PENDING:
+            self.done.set()
+
+    def as_dict(self):
+        return {'id': self.id, 'word': self.word, 'state': self.state, 'definition': self.definition}
+
+
+class AddJobs(object):
+    """Add jobs for a DictionaryStore, fetched through a ProviderRegistry."""
+
+    def __init__(self, store, providers, keep=1000):
+        self.store = store
+        self.providers = providers
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> job, oldest first
+        self._running = {}          # normalized word -> its pending job
+        self._finisher = None
+        self._pid = None
+
+    def submit(self, word):
+        key = normalize_word(word)
+        with self._lock:
+            job = self._running.get(key)
+            if job is not None:
+                return job
+            if word in self.store:
+                job = AddJob(word, EXISTS)
+            else:
+                job = AddJob(word)
+                self._running[key] = job
+            self._remember(job)
+        if job.state == PENDING:
+            future = self.providers.fetch_async(word)
+            if future.done():
+                # settled at once (say, from the fetch cache): finished here,
+                # on the caller's thread, which holds no lookup's lock
+                self._finish(job, key, future)
+            else:
+                future.add_done_callback(lambda future: self._finishing().submit(self._finish, job, key, future))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep:
+            self._jobs.popitem(last=False)
+
+    # store writes serialize anyway, so one thread finishes every job; made
+    # on first use in each process, since threads do not survive fork()
+    def _finishing(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='add-job')
+                    self._pid = os.getpid()
+        return self._finisher
+
+    def _finish(self, job, key, future):
+        try:
+            defn = future.result()
+            if defn is None:
+                job.state = MISSING
+            elif self.store.add(job.word, defn):
+                job.definition = defn
+                job.state = ADDED
+            else:
+                job.state = EXISTS
+        except Exception:
+            job.state = FAILED
+        with self._lock:
+            self._running.pop(key, None)
+        job.done.set()
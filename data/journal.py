@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+
+
+class MutationLog(object):
+    """Append-only log of dictionary mutations, one JSON record per line.
+
+    Every add or delete is a single appended line followed by an fsync, so a
+    write costs O(1) I/O no matter how big the dictionary is. A crash can at
+    worst leave a torn last line; replay() stops in front of it and repair()
+    cuts it off before anything else is appended.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, records):
+        data = ''.join(json.dumps(r) + '\n' for r in records).encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return len(data)
+
+    # yields (record, end_offset) for every complete record after `offset`
+    def replay(self, offset=0):
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return
+                offset += len(line)
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    return
+                yield record, offset
+
+    # the first record, and where the next one starts
+    def first(self):
+        for record, offset in self.replay():
+            return record, offset
+        return None, 0
+
+    # start the log over, holding only `records`; written aside and renamed
+    # into place, so a reader sees the old log or the new one, never a mix
+    def rewrite(self, records):
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(''.join(json.dumps(r) + '\n' for r in records).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # keep a copy of the log as it is now at `path`, replacing any before it
+    def copy_to(self, path):
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        if os.path.exists(self.path):
+            shutil.copyfile(self.path, tmp_path)
+        else:
+            open(tmp_path, 'wb').close()
+        os.replace(tmp_path, path)
+
+    # drop a torn tail left by a crash mid-append; a log that ends in a
+    # newline has none, and is not read through to find that out
+    def repair(self):
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size == 0:
+                    return 0
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) == b'\n':
+                    return size
+        except IOError:
+            return 0
+        end = 0
+        for _, end in self.replay():
+            pass
+        if end != self.size():
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        return end
+
+    def truncate(self):
+        with open(self.path, 'wb') as f:
+            os.fsync(f.fileno())
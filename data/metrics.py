@@ -0,0 +1,165 @@
+"""Opt-in instrumentation: timed spans, event counters and request timings,
+exported in Prometheus' text format (see render()).
+
+Off unless DICTIONARY_METRICS=1 is set (or enable() is called). While off,
+span() hands back one shared do-nothing context manager and count()
+returns straight away, so instrumented code pays a call and a flag check.
+
+    with metrics.span('csv.read'):
+        ...
+    metrics.count('page_cache.hit')
+"""
+
+import bisect
+import os
+import threading
+import time
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'dictionary_span_seconds': ('histogram', 'Time spent in named spans of work.'),
+    'dictionary_request_seconds': ('histogram', 'Time to handle a request, until the response is returned.'),
+    'dictionary_requests_total': ('counter', 'Requests handled, by endpoint and status.'),
+    'dictionary_events_total': ('counter', 'Counted events such as cache hits and misses.'),
+}
+
+enabled = os.environ.get('DICTIONARY_METRICS') == '1'
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+class Histogram(object):
+    __slots__ = ('buckets', 'sum', 'count')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+    """Every histogram and counter, keyed by metric name and a tuple of
+    (label, value) pairs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, metric, labels, value):
+        with self._lock:
+            histogram = self._histograms.get((metric, labels))
+            if histogram is None:
+                histogram = self._histograms[(metric, labels)] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, metric, labels, n=1):
+        with self._lock:
+            self._counters[(metric, labels)] = self._counters.get((metric, labels), 0) + n
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def render(self):
+        with self._lock:
+            histograms = sorted((key, (list(h.buckets), h.sum, h.count)) for key, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        described = set()
+
+        def describe(metric):
+            if metric not in described:
+                described.add(metric)
+                kind, text = HELP.get(metric, ('untyped', metric))
+                lines.append('# HELP %s %s' % (metric, text))
+                lines.append('# TYPE %s %s' % (metric, kind))
+
+        for (metric, labels), (buckets, total, count) in histograms:
+            describe(metric)
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float('inf'),), buckets):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket%s %d' % (metric, format_labels(labels + (('le', le),)), cumulative))
+            lines.append('%s_sum%s %r' % (metric, format_labels(labels), total))
+            lines.append('%s_count%s %d' % (metric, format_labels(labels), count))
+        for (metric, labels), value in counters:
+            describe(metric)
+            lines.append('%s%s %d' % (metric, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{%s}' % ','.join('%s="%s"' % (name, value) for (name, _), value in zip(labels, escaped))
+
+
+registry = Registry()
+
+
+class _Span(object):
+    __slots__ = ('labels', 'start')
+
+    def __init__(self, name):
+        self.labels = (('span', name),)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        registry.observe('dictionary_span_seconds', self.labels, time.perf_counter() - self.start)
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+# a context manager timing the work inside it as span `name`
+def span(name):
+    return _Span(name) if enabled else _NO_SPAN
+
+
+# record span `name` as having taken `seconds`, for work timed elsewhere
+def observe(name, seconds):
+    if enabled:
+        registry.observe('dictionary_span_seconds', (('span', name),), seconds)
+
+
+def count(event, n=1):
+    if enabled:
+        registry.increment('dictionary_events_total', (('event', event),), n)
+
+
+def observe_request(endpoint, method, status, seconds):
+    if enabled:
+        registry.observe('dictionary_request_seconds', (('endpoint', endpoint), ('method', method)), seconds)
+        registry.increment('dictionary_requests_total',
+                           (('endpoint', endpoint), ('method', method), ('status', str(status))))
+
+
+def render():
+    return registry.render()
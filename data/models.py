@@ -1,16 +1,38 @@
-import sqlite3
+from data.pool import ConnectionPool
+from data.schema import path_to_users, create_schema
+
+# every user and auth query shares these per-thread connections (WAL mode,
+# see data/pool.py); sqlite3 keeps each connection's compiled statements in
+# its statement cache, so the constant SQL below is only prepared once
+pool = ConnectionPool(path_to_users)
+create_schema(pool.connection())
+
+INSERT_USER = "INSERT INTO users (username, password) VALUES (?, ?)"
+SELECT_USERS = "SELECT username, password FROM users"
+SELECT_USER = "SELECT username, password FROM users WHERE username = ?"
+UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE username = ?"
+DELETE_USER = "DELETE FROM users WHERE username = ?"
 
 def insert_user(username, password):
-	con = sqlite3.connect('data/users.db')
-	cur = con.cursor()
-	cur.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-	con.commit()
-	con.close()
+	with pool.transaction() as con:
+		con.execute(INSERT_USER, (username, password))
 
 def retrieve_users():
-	con = sqlite3.connect('users.db')
-	cur = con.cursor()
-	cur.execute("SELECT username, password FROM users")
-	users = cur.fetchall()
-	con.close()
-	return users
\ No newline at end of file
+	return pool.connection().execute(SELECT_USERS).fetchall()
+
+def retrieve_user(username):
+	return pool.connection().execute(SELECT_USER, (username,)).fetchone()
+
+# whether `username` is a user whose password is `password`
+def check_password(username, password):
+	user = retrieve_user(username)
+	return user is not None and password is not None and user[1] == password
+
+# these return whether there was such a user
+def update_password(username, password):
+	with pool.transaction() as con:
+		return con.execute(UPDATE_PASSWORD, (password, username)).rowcount > 0
+
+def delete_user(username):
+	with pool.transaction() as con:
+		return con.execute(DELETE_USER, (username,)).rowcount > 0
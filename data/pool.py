@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionPool(object):
+    """Long-lived sqlite3 connections for one database file, one per thread.
+
+    Connections are opened on a thread's first use and then reused for the
+    life of the process, so a query never pays for connect/close. Every
+    connection runs in WAL mode, where readers do not block the writer and
+    the writer does not block readers, which is what lets several app
+    workers share a database. Connections are in autocommit mode; use
+    transaction() to group writes.
+
+    Connections never cross a fork(): SQLite forbids using one in a child
+    process, so a pool used in a forked worker (say, under gunicorn
+    --preload) leaves whatever it inherited to the parent and opens its own.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._pid = os.getpid()
+
+    def connection(self):
+        if self._pid != os.getpid():
+            self._forked()
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                  check_same_thread=False)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            con.execute('PRAGMA foreign_keys=ON')
+            self._local.con = con
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    # the inherited connections are the parent's to close, so they are only
+    # forgotten here
+    def _forked(self):
+        self._lock = threading.Lock()
+        self._connections = []
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    # BEGIN IMMEDIATE takes the write lock up front, so two writers queue on
+    # busy_timeout instead of failing halfway through with SQLITE_BUSY
+    @contextmanager
+    def transaction(self):
+        con = self.connection()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            yield con
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+        else:
+            con.execute('COMMIT')
+
+    def close_all(self):
+        with self._lock:
+            for con in self._connections:
+                con.close()
+            self._connections = []
+        self._local = threading.local()
@@ -1,16 +1,19 @@
+import os
 import sqlite3
 
-conn = sqlite3.connect('users.db')
+path_to_users = os.environ.get('USERS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.db'))
 
-c = conn.cursor()
-
-statement = """CREATE TABLE users (
+statement = """CREATE TABLE IF NOT EXISTS users (
 	id INTEGER PRIMARY KEY AUTOINCREMENT,
 	username TEXT UNIQUE NOT NULL,
 	password TEXT NOT NULL
 );"""
 
-c.execute(statement)
+def create_schema(conn):
+	conn.execute(statement)
 
-conn.commit()
-conn.close()
\ No newline at end of file
+if __name__ == '__main__':
+	conn = sqlite3.connect(path_to_users)
+	create_schema(conn)
+	conn.commit()
+	conn.close()
@@ -0,0 +1,138 @@
+"""Binary dictionary snapshots, read in place through mmap.
+
+A snapshot holds the whole dictionary sorted by normalized word, as three
+columns: the normalized words, the words as stored and the definitions
+(as JSON). Each column is a table of n + 1 little-endian u64 offsets into
+a heap of UTF-8 bytes, so entry i of a column is heap[offsets[i]:
+offsets[i + 1]]. Opening one maps the file and reads its header, nothing
+more; a lookup is a binary search over the key column that decodes only
+the ~log2(n) keys it touches. Pages come from the OS page cache, so every
+worker that maps the same file shares one copy of it.
+
+A snapshot is derived from a source file (the CSV) and records that
+file's (mtime, size) stamp; open_snapshot() refuses one whose stamp does not match,
+so a stale snapshot is never read.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+
+from data.definitions import Entry, dump_definition
+
+MAGIC = b'DICTSNAP'
+FORMAT_VERSION = 1
+# magic, version, entry count, source mtime_ns, source size, and where the
+# key, word and definition columns start
+HEADER = struct.Struct('<8sIIqqQQQ')
+
+
+class Column(object):
+    """A read-only sequence of the strings in one column, decoded on access."""
+
+    def __init__(self, buf, start, count):
+        heap_start = start + (count + 1) * 8
+        self._offsets = buf[start:heap_start].cast('Q')
+        self._heap = buf[heap_start:]
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return str(self._heap[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+
+class Snapshot(object):
+    """A mapped snapshot file. `keys` is the sorted column of normalized
+    words; entry(i), get(key) and word(i) give the store's (word,
+    definition) entries."""
+
+    def __init__(self, path, mapped, count):
+        self.path = path
+        self._map = mapped
+        buf = memoryview(mapped)
+        _, _, _, _, _, keys_at, words_at, definitions_at = HEADER.unpack_from(buf)
+        self.keys = Column(buf[:words_at], keys_at, count)
+        self._words = Column(buf[:definitions_at], words_at, count)
+        self._definitions = Column(buf, definitions_at, count)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def get(self, key):
+        i = self.find(key)
+        return self.entry(i) if i >= 0 else None
+
+    # the index of normalized word `key`, or -1
+    def find(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def entry(self, i):
+        return Entry(self._words[i], json.loads(self._definitions[i]))
+
+    def word(self, i):
+        return self._words[i]
+
+
+# the snapshot at `path` if there is one built from a source stamped
+# `stamp`, otherwise None
+def open_snapshot(path, stamp):
+    if sys.byteorder != 'little':
+        # offsets are read with native memoryview casts
+        return None
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < HEADER.size:
+        mapped.close()
+        return None
+    magic, version, count, mtime_ns, size = HEADER.unpack_from(mapped)[:5]
+    if magic != MAGIC or version != FORMAT_VERSION or (mtime_ns, size) != tuple(stamp):
+        mapped.close()
+        return None
+    return Snapshot(path, mapped, count)
+
+
+def _column(values):
+    offsets = [0]
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return struct.pack('<%dQ' % len(offsets), *offsets), b''.join(values)
+
+
+# write `entries`, (normalized word, (word, definition)) pairs in sorted
+# order, as the snapshot of a source stamped `stamp`. Written to a temp
+# file and renamed into place, so readers only ever map a whole snapshot.
+def write_snapshot(path, entries, stamp):
+    keys, words, definitions = [], [], []
+    for key, (word, defn) in entries:
+        keys.append(key.encode('utf-8'))
+        words.append(word.encode('utf-8'))
+        definitions.append(dump_definition(defn).encode('utf-8'))
+    columns = [_column(keys), _column(words), _column(definitions)]
+    starts = []
+    position = HEADER.size
+    for offsets, heap in columns:
+        starts.append(position)
+        position += len(offsets) + len(heap)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(keys), stamp[0], stamp[1], *starts))
+        for offsets, heap in columns:
+            f.write(offsets)
+            f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
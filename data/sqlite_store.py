@@ -0,0 +1,194 @@
+"""SQLite persistence for the dictionary.
+
+Words, parts of speech and senses live in normalized tables, with a unique
+index on the normalized word. Each write also appends a row to
+`mutations`, which is how other processes sharing the database catch up
+on it without reloading everything.
+
+To move an existing CSV dictionary over:
+
+    python -m data.sqlite_store data/My_Dictionary.csv data/dictionary.db
+
+and point DICTIONARY_PATH at the .db file.
+"""
+
+import os
+import sys
+
+from data import metrics
+from data.definitions import parse_definition
+from data.locking import FileLock
+from data.pool import ConnectionPool
+from data.store import Table, normalize_word, read_csv_rows
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY,
+    word TEXT NOT NULL,
+    norm TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS words_norm ON words (norm);
+
+CREATE TABLE IF NOT EXISTS parts_of_speech (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS senses (
+    word_id INTEGER NOT NULL REFERENCES words (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    pos_id INTEGER NOT NULL REFERENCES parts_of_speech (id),
+    text TEXT NOT NULL,
+    PRIMARY KEY (word_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS mutations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    word TEXT NOT NULL
+);
+"""
+
+SELECT_ALL = """
+SELECT w.word, p.name, s.text
+FROM words w
+JOIN senses s ON s.word_id = w.id
+JOIN parts_of_speech p ON p.id = s.pos_id
+ORDER BY w.id, s.position
+"""
+
+SELECT_ONE = """
+SELECT w.word, p.name, s.text
+FROM words w
+JOIN senses s ON s.word_id = w.id
+JOIN parts_of_speech p ON p.id = s.pos_id
+WHERE w.norm = ?
+ORDER BY s.position
+"""
+
+
+# fold (word, pos, sense) rows, already ordered by word and sense position,
+# back into (word, {pos: [senses]}) pairs
+def _group(rows):
+    word, defn = None, None
+    for w, pos, text in rows:
+        if w != word:
+            if word is not None:
+                yield word, defn
+            word, defn = w, {}
+        defn.setdefault(pos, []).append(text)
+    if word is not None:
+        yield word, defn
+
+
+class SqliteBackend(object):
+    """Dictionary persistence in a SQLite database, used by DictionaryStore.
+
+    The cursor handed back to the store is the last `mutations.seq` it has
+    seen. compact() trims old mutations; a store whose cursor falls behind
+    the trimmed range just reloads.
+    """
+
+    def __init__(self, path, keep_mutations=10000):
+        self.path = path
+        self.keep_mutations = keep_mutations
+        self.pool = ConnectionPool(path)
+        self.pool.connection().executescript(SCHEMA)
+        # SQLite serializes the writes themselves; this also covers the
+        # store's check-then-write across workers
+        self.write_lock = FileLock(os.path.splitext(path)[0] + '.lock')
+
+    def _last_seq(self, con):
+        return con.execute('SELECT COALESCE(MAX(seq), 0) FROM mutations').fetchone()[0]
+
+    def load(self):
+        con = self.pool.connection()
+        with metrics.span('sqlite.read'):
+            con.execute('BEGIN')
+            try:
+                cursor = self._last_seq(con)
+                rows = list(_group(con.execute(SELECT_ALL)))
+            finally:
+                con.execute('COMMIT')
+        return Table(rows), cursor
+
+    def lookup(self, word):
+        for _, defn in _group(self.pool.connection().execute(SELECT_ONE, (normalize_word(word),))):
+            return defn
+        return None
+
+    # (records since `cursor`, new cursor, None), or None when they have
+    # been trimmed away
+    def changes(self, cursor):
+        con = self.pool.connection()
+        first = con.execute('SELECT MIN(seq) FROM mutations').fetchone()[0]
+        if first is not None and cursor < first - 1:
+            return None
+        records = []
+        for seq, op, word in con.execute('SELECT seq, op, word FROM mutations WHERE seq > ? ORDER BY seq',
+                                         (cursor,)).fetchall():
+            cursor = seq
+            record = {'op': op, 'word': word}
+            if op == 'add':
+                record['definition'] = self.lookup(word)
+                if record['definition'] is None:
+                    # deleted again by a later mutation
+                    continue
+            records.append(record)
+        return records, cursor, None
+
+    def tag(self, cursor):
+        return '%x' % cursor
+
+    def _insert(self, con, word, defn):
+        cur = con.execute('INSERT OR IGNORE INTO words (word, norm) VALUES (?, ?)',
+                          (word, normalize_word(word)))
+        if cur.rowcount == 0:
+            return False
+        word_id = cur.lastrowid
+        position = 0
+        for pos, senses in defn.items():
+            con.execute('INSERT OR IGNORE INTO parts_of_speech (name) VALUES (?)', (pos,))
+            pos_id = con.execute('SELECT id FROM parts_of_speech WHERE name = ?', (pos,)).fetchone()[0]
+            for text in senses:
+                con.execute('INSERT INTO senses (word_id, position, pos_id, text) VALUES (?, ?, ?, ?)',
+                            (word_id, position, pos_id, text))
+                position += 1
+        return True
+
+    def commit(self, records, cursor=None):
+        with metrics.span('sqlite.commit'), self.pool.transaction() as con:
+            for record in records:
+                if record['op'] == 'add':
+                    if not self._insert(con, record['word'], record['definition']):
+                        continue
+                elif record['op'] == 'delete':
+                    cur = con.execute('DELETE FROM words WHERE norm = ?', (normalize_word(record['word']),))
+                    if cur.rowcount == 0:
+                        continue
+                con.execute('INSERT INTO mutations (op, word) VALUES (?, ?)', (record['op'], record['word']))
+
+    # the tables are always current, so compacting only trims the mutation
+    # feed and checkpoints the WAL; the store's rows, already in memory,
+    # become its new base
+    def compact(self, rows, cursor):
+        with metrics.span('sqlite.compact'):
+            with self.pool.transaction() as con:
+                con.execute('DELETE FROM mutations WHERE seq <= ?', (self._last_seq(con) - self.keep_mutations,))
+            self.pool.connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return cursor, Table(rows)
+
+
+# one-shot import of a CSV dictionary; words already in the database are kept
+def import_csv(csv_path, db_path):
+    backend = SqliteBackend(db_path)
+    records = [{'op': 'add', 'word': w, 'definition': parse_definition(d)}
+               for w, d in read_csv_rows(csv_path)]
+    backend.commit(records)
+    return len(records)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m data.sqlite_store <dictionary.csv> <dictionary.db>')
+    print("Imported", import_csv(sys.argv[1], sys.argv[2]), "words into", sys.argv[2])
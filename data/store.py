@@ -0,0 +1,754 @@
+import bisect
+import csv
+import hashlib
+import os
+import re
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from data import metrics
+from data.definitions import Entry, dump_definition, parse_definition
+from data.journal import MutationLog
+from data.locking import FileLock
+from data.snapshot import open_snapshot, write_snapshot
+
+COLUMNS = ['Word', 'Definition']
+
+
+class DictionaryChanged(RuntimeError):
+    """Raised instead of writing when the dictionary file changed under the
+    store since it last caught up; the store reloads on its next read."""
+
+
+# the key every lookup goes through, so 'Abject', 'abject ' and 'abject'
+# all find the same entry
+def normalize_word(word):
+    return word.strip().lower()
+
+
+# the (word, definition text) rows of a Word,Definition CSV
+def read_csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, COLUMNS)
+        word_at, definition_at = header.index('Word'), header.index('Definition')
+        return [(row[word_at], row[definition_at]) for row in reader if row]
+
+
+def write_csv_rows(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(COLUMNS)
+        writer.writerows((w, dump_definition(d)) for w, d in rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Table(object):
+    """A dictionary held in memory, built from (word, definition) rows.
+
+    The base a backend hands the store when it has no snapshot to map; it
+    answers like a Snapshot (data/snapshot.py): `keys` in sorted order,
+    entry(i), word(i), get(key) and `in`.
+    """
+
+    def __init__(self, rows):
+        with metrics.span('store.parse'):
+            self._entries = dict((normalize_word(w), Entry(w, parse_definition(d))) for w, d in rows)
+        with metrics.span('store.sort'):
+            self.keys = sorted(self._entries)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def entry(self, i):
+        return self._entries[self.keys[i]]
+
+    def word(self, i):
+        return self._entries[self.keys[i]][0]
+
+    # (normalized word, entry) pairs in order, as write_snapshot() takes them
+    def items(self):
+        return ((key, self._entries[key]) for key in self.keys)
+
+
+_UNCHANGED = object()
+
+
+class Entries(Mapping):
+    """The dictionary as the store holds it: normalized word -> (word,
+    definition), walked in sorted order.
+
+    A read-only base (a Table, or a mapped Snapshot) plus what changed
+    since it was loaded: `changed` maps a key to its new entry, or to None
+    once deleted, and `new_keys` lists the keys that are not in the base,
+    sorted. Only the store writes (set(), discard() and rebase(), under its
+    lock); readers take no lock, and walk the keys a slice at a time so
+    they stay in order across concurrent changes. The three are held as
+    one tuple, so rebase() swaps them for a reader all at once.
+    """
+
+    def __init__(self, base):
+        self._layers = (base, {}, [])
+        self._len = len(base)
+
+    # carry on from `base`, which holds exactly what this does now (say, a
+    # snapshot the changes were just folded into), with nothing on top
+    def rebase(self, base):
+        self._layers = (base, {}, [])
+
+    def get(self, key, default=None):
+        base, changed, _ = self._layers
+        entry = changed.get(key, _UNCHANGED)
+        if entry is _UNCHANGED:
+            entry = base.get(key)
+        return default if entry is None else entry
+
+    def __getitem__(self, key):
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __contains__(self, key):
+        base, changed, _ = self._layers
+        entry = changed.get(key, _UNCHANGED)
+        if entry is _UNCHANGED:
+            return key in base
+        return entry is not None
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return (key for key, _ in self.items())
+
+    # the layers, and (key, base index or -1) for up to `limit` keys after
+    # `start` (or from it, if `inclusive`), merging the base's keys with the
+    # new ones
+    def _slice(self, start, limit, inclusive):
+        layers = base, changed, new_keys = self._layers
+        base_keys = base.keys
+        if start is None:
+            i = j = 0
+        else:
+            find = bisect.bisect_left if inclusive else bisect.bisect_right
+            i, j = find(base_keys, start), find(new_keys, start)
+        new_keys = new_keys[j:j + limit]
+        n, k = len(base_keys), 0
+        base_key = base_keys[i] if i < n else None
+        found = []
+        while len(found) < limit:
+            new_key = new_keys[k] if k < len(new_keys) else None
+            if base_key is None and new_key is None:
+                break
+            if new_key is None or (base_key is not None and base_key < new_key):
+                if changed.get(base_key, _UNCHANGED) is not None:
+                    found.append((base_key, i))
+                i += 1
+                base_key = base_keys[i] if i < n else None
+            else:
+                found.append((new_key, -1))
+                k += 1
+        return layers, found
+
+    def keys_from(self, start=None, limit=256, inclusive=False):
+        return [key for key, _ in self._slice(start, limit, inclusive)[1]]
+
+    # like keys_from(), paired with their entries; an entry is None when the
+    # key was deleted while this ran
+    def items_from(self, start=None, limit=256, inclusive=False):
+        (base, changed, _), found = self._slice(start, limit, inclusive)
+        items = []
+        for key, i in found:
+            entry = changed.get(key, _UNCHANGED)
+            if entry is _UNCHANGED:
+                entry = base.entry(i) if i >= 0 else None
+            items.append((key, entry))
+        return items
+
+    def items(self):
+        start = None
+        while True:
+            items = self.items_from(start, 1024)
+            if not items:
+                return
+            for key, entry in items:
+                if entry is not None:
+                    yield key, entry
+            start = items[-1][0]
+
+    # (key, stored word) pairs in order, without decoding any definitions
+    def words(self):
+        start = None
+        while True:
+            (base, changed, _), found = self._slice(start, 1024, False)
+            if not found:
+                return
+            for key, i in found:
+                entry = changed.get(key, _UNCHANGED)
+                if entry is _UNCHANGED:
+                    if i >= 0:
+                        yield key, base.word(i)
+                elif entry is not None:
+                    yield key, entry[0]
+            start = found[-1][0]
+
+    def set(self, key, entry):
+        base, changed, new_keys = self._layers
+        if key not in self:
+            if key not in base:
+                bisect.insort(new_keys, key)
+            self._len += 1
+        changed[key] = entry
+
+    # returns whether there was an entry to delete
+    def discard(self, key):
+        base, changed, new_keys = self._layers
+        if key not in self:
+            return False
+        if key in base:
+            changed[key] = None
+        else:
+            del new_keys[bisect.bisect_left(new_keys, key)]
+            del changed[key]
+        self._len -= 1
+        return True
+
+
+class CsvBackend(object):
+    """Dictionary persistence as a sorted CSV snapshot plus an append-only
+    mutation log next to it (see data/journal.py).
+
+    A single add or delete only appends to the log; compact() folds the log
+    back into a fresh snapshot. Each CSV snapshot also gets a binary copy
+    (see data/snapshot.py) that later loads map instead of parsing the CSV,
+    named after the CSV's stamp (<name>.<mtime_ns>-<size>.snap, in hex):
+    a new CSV gets a new file rather than one renamed over a snapshot other
+    processes still have mapped, which Windows refuses. Snapshots of older
+    CSVs are removed once a newer one is in place, or left for next time
+    while they are still mapped. Appends and compactions from every process
+    are serialized by `write_lock`; a snapshot is written aside and renamed
+    into place, so readers never see half a file. The cursor handed back
+    to the store is the CSV's (mtime, size) and how far into the log it has
+    read, so growth of the log alone only replays the new tail.
+
+    Every log starts with a header record naming the CSV its records apply
+    to, by stamp and by digest. A compaction starts the log over with a
+    header naming the new CSV and the point in the old log it folded in,
+    and keeps the old log as <name>.prev.log. Another process reading along
+    can then finish the old log and move onto the new snapshot, which holds
+    exactly what it already has, instead of reloading everything.
+
+    Any other change to the CSV's stamp (an editor, a restore, a checkout,
+    a touch) makes every store reload. If the CSV's contents are still
+    those the log was written against, the log is kept and restamped;
+    otherwise it is set aside as <name>.orphaned-<time>.log rather than
+    replayed onto a dictionary it was not written for. Writes are refused
+    (DictionaryChanged) until the store has caught up with the new CSV.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.log = MutationLog(os.path.splitext(path)[0] + '.log')
+        self.previous_log = MutationLog(os.path.splitext(path)[0] + '.prev.log')
+        self.write_lock = FileLock(os.path.splitext(path)[0] + '.lock')
+
+    # the snapshot of the CSV stamped `stamp`
+    def snapshot_path(self, stamp):
+        return '%s.%x-%x.snap' % (os.path.splitext(self.path)[0], stamp[0], stamp[1])
+
+    # remove the snapshots of CSVs other than the one stamped `stamp`,
+    # including an unstamped <name>.snap from before snapshots were named
+    def _remove_old_snapshots(self, stamp):
+        directory, name = os.path.split(os.path.splitext(self.path)[0])
+        pattern = re.compile(re.escape(name) + r'(\.[0-9a-f]+-[0-9a-f]+)?\.snap$')
+        keep = os.path.basename(self.snapshot_path(stamp))
+        for entry in os.listdir(directory or os.curdir):
+            if entry != keep and pattern.match(entry):
+                try:
+                    os.remove(os.path.join(directory, entry))
+                except OSError:
+                    pass
+
+    def _file_stamp(self, path=None):
+        st = os.stat(path or self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _file_digest(self, path=None):
+        digest = hashlib.sha1()
+        with open(path or self.path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    # the header that starts a log of changes to the CSV stamped `stamp`
+    def _base_record(self, stamp, digest, after=None):
+        record = {'op': 'base', 'stamp': list(stamp), 'digest': digest}
+        if after is not None:
+            record['after'] = after
+        return record
+
+    # the log's header and where its records start; (None, 0) for a log
+    # written before logs had headers, or none at all
+    def _header(self, log=None):
+        record, offset = (log or self.log).first()
+        if record is None or record.get('op') != 'base':
+            return None, 0
+        return record, offset
+
+    # whether the log holds changes to the CSV stamped `stamp`; an empty
+    # log holds none, so it does
+    def _log_matches(self, header, stamp):
+        if header is None:
+            return self.log.size() == 0
+        return tuple(header['stamp']) == stamp
+
+    # Loading takes no lock unless the log does not match the CSV: a torn
+    # tail a crash left on the log is only cut off by the next writer (see
+    # commit()), and replay stops in front of it until then.
+    def load(self):
+        while True:
+            stamp = self._file_stamp()
+            header, offset = self._header()
+            if not self._log_matches(header, stamp):
+                with self.write_lock:
+                    self._claim_log()
+                continue
+            base = self._open_base(stamp)
+            if base is not None:
+                return base, (stamp, offset)
+
+    # Called with `write_lock` held when the log does not match the CSV.
+    # Either a compaction has put its CSV in place but not its log yet, and
+    # the lock waited for it to finish, or the CSV changed from outside the
+    # store. A log written before logs had headers counts as the CSV's if
+    # the CSV has not changed since the log was last written to.
+    def _claim_log(self):
+        stamp = self._file_stamp()
+        header, offset = self._header()
+        if self._log_matches(header, stamp):
+            return
+        digest = self._file_digest()
+        if header is not None:
+            same = header.get('digest') == digest
+        else:
+            same = stamp[0] <= os.stat(self.log.path).st_mtime_ns
+        if same:
+            records = [record for record, _ in self.log.replay(offset)]
+            self.log.rewrite([self._base_record(stamp, digest)] + records)
+        else:
+            self.log.copy_to('%s.orphaned-%s.log' % (os.path.splitext(self.path)[0],
+                                                       time.strftime('%Y%m%d-%H%M%S')))
+            self.log.rewrite([self._base_record(stamp, digest)])
+
+    # the dictionary as of the CSV stamped `stamp`: its snapshot, or the CSV
+    # itself parsed; None if the CSV has moved on since
+    def _open_base(self, stamp):
+        with metrics.span('snapshot.open'):
+            base = open_snapshot(self.snapshot_path(stamp), stamp)
+        if base is not None:
+            return base
+        with metrics.span('csv.read'):
+            rows = read_csv_rows(self.path)
+        if self._file_stamp() != stamp:
+            return None
+        base = Table(rows)
+        return self._write_snapshot(base.items(), stamp) or base
+
+    # the snapshot is only a faster copy of the CSV, so failing to write
+    # one (say, a read-only directory) just means parsing the CSV next time
+    def _write_snapshot(self, entries, stamp):
+        try:
+            with metrics.span('snapshot.write'):
+                write_snapshot(self.snapshot_path(stamp), entries, stamp)
+        except OSError:
+            return None
+        self._remove_old_snapshots(stamp)
+        return open_snapshot(self.snapshot_path(stamp), stamp)
+
+    # the records in `log` from `offset` (up to `end`), and where they stop
+    def _replay(self, log, offset, end=None):
+        records = []
+        with metrics.span('log.replay'):
+            for record, next_offset in log.replay(offset):
+                if end is not None and next_offset > end:
+                    break
+                offset = next_offset
+                if record.get('op') != 'base':
+                    records.append(record)
+        return records, offset
+
+    # Records since `cursor`, as (records, cursor, base). `base` is None
+    # unless another process compacted: then the records are the rest of
+    # the log it folded, and `base` the new snapshot to carry on from once
+    # they are applied. None when the store has fallen too far behind to
+    # follow and must reload.
+    def changes(self, cursor):
+        stamp, offset = cursor
+        current = self._file_stamp()
+        if current == stamp:
+            if self.log.size() < offset:
+                return None
+            records, offset = self._replay(self.log, offset)
+            return records, (stamp, offset), None
+        header, start = self._header()
+        if header is None or tuple(header['stamp']) != current or 'after' not in header:
+            # not a compaction whose log is in place: one still under way,
+            # or a change from outside the store, which load() sorts out
+            return None
+        folded_stamp, folded_offset = tuple(header['after'][:2]), header['after'][2]
+        if folded_stamp != stamp or folded_offset < offset:
+            return None
+        previous, _ = self._header(self.previous_log)
+        if previous is not None and tuple(previous['stamp']) != stamp:
+            return None
+        records, end = self._replay(self.previous_log, offset, folded_offset)
+        if end != folded_offset:
+            return None
+        base = self._open_base(current)
+        if base is None:
+            return None
+        return records, (current, start), base
+
+    # the CSV the cursor is on and how far into its log, which only ever
+    # name one state of the dictionary
+    def tag(self, cursor):
+        (mtime_ns, size), offset = cursor
+        return '%x-%x-%x' % (mtime_ns, size, offset)
+
+    # Called with `write_lock` held, so no other writer can be mid-append
+    # when a torn tail is cut off. The records are written against the
+    # dictionary as of `cursor`, so they are refused if the CSV has changed
+    # since; the first records in an empty log get its header in front.
+    def commit(self, records, cursor):
+        stamp = cursor[0]
+        if self._file_stamp() != stamp:
+            raise DictionaryChanged(self.path)
+        if self.log.repair() == 0:
+            records = [self._base_record(stamp, self._file_digest())] + list(records)
+        with metrics.span('log.append'):
+            self.log.append(records)
+
+    # The CSV is written aside and renamed into place, so a crash never
+    # leaves half a CSV, and its snapshot is ready before it is. The old
+    # log is kept until the next compaction, and the new one is put in
+    # place last: a process that sees it finds everything it points to.
+    # Returns the new cursor and the new base, which holds `rows`.
+    def compact(self, rows, cursor):
+        stamp, offset = cursor
+        if self._file_stamp() != stamp:
+            raise DictionaryChanged(self.path)
+        tmp_path = self.path + '.tmp'
+        with metrics.span('csv.write'):
+            write_csv_rows(tmp_path, rows)
+        new_stamp, digest = self._file_stamp(tmp_path), self._file_digest(tmp_path)
+        base = self._write_snapshot(((normalize_word(w), (w, d)) for w, d in rows), new_stamp)
+        self.log.copy_to(self.previous_log.path)
+        os.replace(tmp_path, self.path)
+        self.log.rewrite([self._base_record(new_stamp, digest, after=[stamp[0], stamp[1], offset])])
+        return (new_stamp, self._header()[1]), base or Table(rows)
+
+
+class DictionaryStore(object):
+    """Long-lived, in-memory copy of the dictionary.
+
+    Persistence is delegated to a backend (CsvBackend above, or
+    SqliteBackend in data/sqlite_store.py). The backend is read once and
+    every read is served from memory. Changes made by other processes are
+    picked up through the backend's change feed, a check that is throttled
+    to once per `check_interval` seconds so a burst of page views costs no
+    I/O at all. compact() asks the backend to fold its change feed away,
+    either on demand or from a background thread once start_compactor() has
+    asked for one. That thread is started by the first read or write in each
+    process, so a store opened before a fork() (gunicorn --preload) still
+    gets one in every worker.
+
+    Entries live in `_entries` (Entries above), a normalized word -> (word,
+    definition) mapping that is kept up to date on add and delete rather
+    than rebuilt per request, and walks its keys in sorted order. Its base
+    is whatever the backend loaded: a mapped binary snapshot, which costs
+    next to nothing to open whatever its size, or an in-memory Table.
+    Definitions are handed out parsed (see data/definitions.py).
+
+    Indexes built on top of the store register with subscribe() and are
+    told about every change, whichever process made it: reset(entries)
+    after a (re)load, then added(key, entry) and removed(key). Moving onto
+    a snapshot another process has compacted the same contents into is not
+    a change, and tells them nothing.
+
+    `etag` names the current contents for caches and ETags by how far into
+    the backend's change feed they are, so every worker reading the same
+    dictionary, and the same worker after a restart, gives the same
+    contents the same tag.
+    """
+
+    def __init__(self, backend, check_interval=1.0, compact_after=500):
+        self.backend = backend
+        self.check_interval = check_interval
+        self.compact_after = compact_after
+        self._lock = threading.RLock()
+        self._entries = None
+        self._listeners = []
+        self._frame = None
+        self._cursor = None
+        self._pending = 0
+        self._checked_at = 0.0
+        self._compact_wanted = threading.Event()
+        self._compactor_interval = None
+        self._compactor_pid = None
+        self._compactor_lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._entries is not None and now - self._checked_at < self.check_interval:
+            return
+        self._ensure_compactor()
+        # a reader never waits for a writer: if a write is in progress it
+        # is served what is in memory and checks again next time
+        if not self._lock.acquire(blocking=self._entries is None):
+            return
+        try:
+            self._catch_up()
+            self._checked_at = now
+        finally:
+            self._lock.release()
+
+    def _load(self):
+        base, cursor = self.backend.load()
+        self._entries = Entries(base)
+        self._cursor = cursor
+        self._pending = 0
+        self._frame = None
+        for listener in self._listeners:
+            with metrics.span('index.reset.' + type(listener).__name__):
+                listener.reset(self._entries)
+
+    def _catch_up(self):
+        if self._entries is None:
+            self._load()
+        while True:
+            changes = self.backend.changes(self._cursor)
+            if changes is None:
+                self._load()
+                continue
+            records, cursor, base = changes
+            for record in records:
+                self._apply(record)
+            if records:
+                self._pending += len(records)
+                self._frame = None
+            # moved on only once the records are in, so it never names
+            # more than readers can see
+            self._cursor = cursor
+            if base is None:
+                break
+            # another process compacted: same contents, nothing pending
+            self._entries.rebase(base)
+            self._pending = 0
+        if self._pending >= self.compact_after:
+            self._compact_wanted.set()
+
+    # change records are idempotent upserts / deletes, so replaying one that
+    # is already reflected in the loaded state is harmless
+    def _apply(self, record):
+        key = normalize_word(record['word'])
+        if record['op'] == 'add':
+            entry = Entry(record['word'], parse_definition(record['definition']))
+            self._entries.set(key, entry)
+            for listener in self._listeners:
+                listener.added(key, entry)
+        elif record['op'] == 'delete':
+            if self._entries.discard(key):
+                for listener in self._listeners:
+                    listener.removed(key)
+
+    # local writes come back through the change feed like everyone else's,
+    # so memory always matches what the backend actually accepted
+    def _commit(self, records):
+        self.backend.commit(records, self._cursor)
+        self._catch_up()
+
+    # Writers hold the store's thread lock and the backend's cross-process
+    # lock, and catch up on other processes' writes before deciding
+    # anything, so concurrent adds and deletes serialize instead of racing.
+    @contextmanager
+    def _writing(self):
+        self._ensure_compactor()
+        with self._lock:
+            with self.backend.write_lock:
+                self._catch_up()
+                yield
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._refresh()
+            self._listeners.append(listener)
+            listener.reset(self._entries)
+
+    # the cursor only moves on once its changes are in memory, so the tag is
+    # never newer than what a read right after it sees
+    @property
+    def etag(self):
+        self._refresh()
+        return self.backend.tag(self._cursor)
+
+    @property
+    def frame(self):
+        # a sorted DataFrame of the whole dictionary, for analysis in a
+        # shell or notebook; the app never needs one, so pandas is only
+        # imported here. Rebuilt lazily after a change; read-only for callers.
+        import pandas as pd
+        self._refresh()
+        frame = self._frame
+        if frame is None:
+            frame = pd.DataFrame(self.rows(), columns=COLUMNS)
+            self._frame = frame
+        return frame
+
+    def rows(self):
+        return list(self.iter_rows())
+
+    # (word, definition) pairs in alphabetical order, starting after the
+    # normalized word `after`. Keys are taken `chunk` at a time, so walking
+    # the whole dictionary holds no copy of it, never blocks writers, and
+    # stays in order across concurrent adds and deletes.
+    def iter_rows(self, after=None, chunk=256):
+        while True:
+            self._refresh()
+            items = self._entries.items_from(after, chunk)
+            if not items:
+                return
+            for key, row in items:
+                # None when deleted since the slice was taken
+                if row is not None:
+                    yield row
+            after = items[-1][0]
+
+    # up to `limit` stored words starting with `prefix`, alphabetically: a
+    # binary search into the sorted keys and a short slice from there
+    def complete(self, prefix, limit=10):
+        self._refresh()
+        prefix = normalize_word(prefix)
+        words = []
+        for key, entry in self._entries.items_from(prefix, limit, inclusive=True):
+            if not key.startswith(prefix):
+                break
+            if entry is not None:
+                words.append(entry[0])
+        return words
+
+    def __len__(self):
+        self._refresh()
+        return len(self._entries)
+
+    def __contains__(self, word):
+        self._refresh()
+        return normalize_word(word) in self._entries
+
+    # returns (word, definition) as stored, or None; the definition dict is
+    # shared, so callers must not modify it
+    def get(self, word):
+        self._refresh()
+        return self._entries.get(normalize_word(word))
+
+    def add(self, word, definition):
+        with self._writing():
+            if normalize_word(word) in self._entries:
+                return False
+            self._commit([{'op': 'add', 'word': word, 'definition': parse_definition(definition)}])
+            return True
+
+    def delete(self, word):
+        with self._writing():
+            entry = self._entries.get(normalize_word(word))
+            if entry is None:
+                return False
+            self._commit([{'op': 'delete', 'word': entry[0]}])
+            return True
+
+    # add many words in one commit, skipping words already in the store (or
+    # repeated in `entries`); returns the words actually added
+    def add_many(self, entries):
+        with self._writing():
+            seen = set()
+            records = []
+            for word, definition in entries:
+                key = normalize_word(word)
+                if key in self._entries or key in seen:
+                    continue
+                seen.add(key)
+                records.append({'op': 'add', 'word': word, 'definition': parse_definition(definition)})
+            if records:
+                self._commit(records)
+            return [record['word'] for record in records]
+
+    # set the definitions of many words in one commit, adding words that
+    # are missing and overwriting the ones already there
+    def replace(self, entries):
+        with self._writing():
+            records = []
+            for word, definition in entries:
+                entry = self._entries.get(normalize_word(word))
+                if entry is not None:
+                    records.append({'op': 'delete', 'word': entry[0]})
+                records.append({'op': 'add', 'word': word, 'definition': parse_definition(definition)})
+            if records:
+                self._commit(records)
+            return len(entries)
+
+    def compact(self):
+        with self._writing():
+            self._compact_wanted.clear()
+            if self._pending == 0:
+                return
+            self._cursor, base = self.backend.compact(self.rows(), self._cursor)
+            # the new base holds what the entries do, so nothing has changed
+            # for readers or listeners, but the overlay can go
+            self._entries.rebase(base)
+            self._pending = 0
+
+    # compact in the background every `interval` seconds, or as soon as
+    # `compact_after` changes have piled up
+    def start_compactor(self, interval=60.0):
+        self._compactor_interval = interval
+
+    # threads do not survive fork(), so each process starts its own
+    def _ensure_compactor(self):
+        if self._compactor_interval is None or self._compactor_pid == os.getpid():
+            return
+        with self._compactor_lock:
+            if self._compactor_pid == os.getpid():
+                return
+            self._compactor_pid = os.getpid()
+            thread = threading.Thread(target=self._run_compactor, name='dictionary-compactor')
+            thread.daemon = True
+            thread.start()
+
+    def _run_compactor(self):
+        while True:
+            self._compact_wanted.wait(self._compactor_interval)
+            try:
+                self.compact()
+            except DictionaryChanged:
+                # changed from outside mid-way; caught up by the next round
+                pass
+
+
+# a store for `path`: a SQLite database for .db / .sqlite files, otherwise
+# a CSV snapshot with its mutation log
+def open_store(path, **kwargs):
+    if os.path.splitext(path)[1] in ('.db', '.sqlite'):
+        from data.sqlite_store import SqliteBackend
+        backend = SqliteBackend(path)
+    else:
+        backend = CsvBackend(path)
+    return DictionaryStore(backend, **kwargs)
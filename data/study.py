@@ -0,0 +1,128 @@
+"""Spaced-repetition study scheduling.
+
+Each word has a review state (SM-2 style: repetitions, interval, ease) and
+a due time, kept in SQLite with an index on the due column, so the next
+card is one index probe rather than a scan of the dictionary. A card
+answered right comes back after a growing interval; one answered wrong
+comes back within the session and starts over.
+"""
+
+import random
+import threading
+import time
+
+from data.pool import ConnectionPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    word TEXT PRIMARY KEY,
+    due REAL NOT NULL,
+    interval REAL NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    lapses INTEGER NOT NULL DEFAULT 0,
+    reviewed_at REAL
+);
+CREATE INDEX IF NOT EXISTS reviews_due ON reviews (due);
+"""
+
+DAY = 24 * 60 * 60
+# a card answered wrong is asked again this many seconds later
+RELEARN_DELAY = 10 * 60
+
+# answer qualities on the SM-2 0-5 scale for the two study buttons
+RIGHT = 4
+WRONG = 1
+
+
+# SM-2: returns the new (interval_days, ease, repetitions, lapses, due)
+def review(interval, ease, repetitions, lapses, quality, now):
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0, ease, 0, lapses + 1, now + RELEARN_DELAY
+    repetitions += 1
+    if repetitions == 1:
+        interval = 1
+    elif repetitions == 2:
+        interval = 6
+    else:
+        interval = round(interval * ease, 1)
+    return interval, ease, repetitions, lapses, now + interval * DAY
+
+
+class StudyScheduler(object):
+    """Review state for every word in a DictionaryStore.
+
+    Subscribe it to the store (store.subscribe(scheduler)) and it keeps
+    itself in step: new words become due immediately, deleted words are
+    dropped, and after a reload the table is synced against the store
+    once, when it is next used.
+    """
+
+    def __init__(self, path):
+        self.pool = ConnectionPool(path)
+        self.pool.connection().executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._unsynced = None
+
+    def _sync(self):
+        with self._lock:
+            entries, self._unsynced = self._unsynced, None
+            if entries is None:
+                return
+            now = time.time()
+            with self.pool.transaction() as con:
+                known = set(w for (w,) in con.execute('SELECT word FROM reviews'))
+                # jitter the new cards' due times so they come up shuffled
+                # words() walks the keys without decoding any definitions
+                con.executemany('INSERT INTO reviews (word, due) VALUES (?, ?)',
+                                ((key, now + random.random()) for key, _ in entries.words() if key not in known))
+                con.executemany('DELETE FROM reviews WHERE word = ?',
+                                ((key,) for key in known if key not in entries))
+
+    # store listener interface
+
+    def reset(self, entries):
+        self._unsynced = entries
+
+    def added(self, key, entry):
+        with self.pool.transaction() as con:
+            con.execute('INSERT OR IGNORE INTO reviews (word, due) VALUES (?, ?)', (key, time.time()))
+
+    def removed(self, key):
+        with self.pool.transaction() as con:
+            con.execute('DELETE FROM reviews WHERE word = ?', (key,))
+
+    # the normalized word whose review is due soonest (possibly in the
+    # future, once everything due has been studied), or None
+    def next_word(self):
+        self._sync()
+        row = self.pool.connection().execute('SELECT word FROM reviews ORDER BY due LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def state(self, key):
+        self._sync()
+        row = self.pool.connection().execute(
+            'SELECT due, interval, ease, repetitions, lapses FROM reviews WHERE word = ?', (key,)).fetchone()
+        return dict(zip(('due', 'interval', 'ease', 'repetitions', 'lapses'), row)) if row else None
+
+    def due_count(self):
+        self._sync()
+        return self.pool.connection().execute('SELECT COUNT(*) FROM reviews WHERE due <= ?',
+                                              (time.time(),)).fetchone()[0]
+
+    # record an answer of `quality` (0-5, see RIGHT / WRONG); returns the
+    # new due time, or None for a word that is not being studied
+    def answer(self, key, quality):
+        self._sync()
+        now = time.time()
+        with self.pool.transaction() as con:
+            row = con.execute('SELECT interval, ease, repetitions, lapses FROM reviews WHERE word = ?',
+                              (key,)).fetchone()
+            if row is None:
+                return None
+            interval, ease, repetitions, lapses, due = review(*row, quality=quality, now=now)
+            con.execute('UPDATE reviews SET due = ?, interval = ?, ease = ?, repetitions = ?, lapses = ?, '
+                        'reviewed_at = ? WHERE word = ?',
+                        (due, interval, ease, repetitions, lapses, now, key))
+        return due
@@ -0,0 +1,107 @@
+"""Rendered pages, kept until the dictionary changes.
+
+The app's pages are a function of the URL and the dictionary, so a page
+rendered once can be sent again as-is until the store's contents move on
+(see DictionaryStore.etag). Pages are kept under the view and its full
+URL in an LRU that holds at most `max_bytes` of page bodies in all, so a
+few large pages (a full word list) cannot push memory past it the way a
+count of pages could. Each page is stamped with the tag of the contents
+it was rendered from: a page from older contents is a miss and is
+rendered and replaced, so every add or delete invalidates them all.
+Responses carry that tag as their ETag with Cache-Control: no-cache, so
+browsers and proxies revalidate and get an empty 304 while nothing has
+changed.
+Streamed pages are cached as they are sent.
+"""
+
+import functools
+import threading
+from collections import OrderedDict
+
+from flask import Response, make_response, request, session
+
+from data import metrics
+
+
+class PageCache(object):
+
+    def __init__(self, store, max_bytes=64 << 20, max_page_size=1 << 20):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_page_size = max_page_size
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()  # key -> (tag, body, status, mimetype)
+        self._size = 0               # bytes of body in _pages
+
+    def _get(self, key, tag):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None or page[0] != tag:
+                return None
+            self._pages.move_to_end(key)
+            return page
+
+    def _put(self, key, page):
+        if len(page[1]) > min(self.max_page_size, self.max_bytes):
+            return
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._pages[key] = page
+            self._size += len(page[1])
+            while self._size > self.max_bytes:
+                self._size -= len(self._pages.popitem(last=False)[1][1])
+
+    # pass a streamed body through, keeping a copy once it has all been sent
+    def _tee(self, key, tag, chunks, status, mimetype):
+        body = []
+        size = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            size += len(chunk)
+            if size <= self.max_page_size:
+                body.append(chunk)
+            yield chunk
+        if size <= self.max_page_size:
+            self._put(key, (tag, b''.join(body), status, mimetype))
+
+    # `render()`'s response, or the copy made from the same dictionary
+    # contents; GETs also get their tag as ETag and may be answered 304
+    def respond(self, key, render):
+        # named before rendering, so the tag is never newer than the page
+        tag = self.store.etag
+        is_get = request.method in ('GET', 'HEAD')
+        if '_flashes' in session:
+            # a pending flash message is shown once, so this page is a one-off
+            return make_response(render())
+        if is_get and tag in request.if_none_match:
+            metrics.count('page_cache.not_modified')
+            response = Response(status=304)
+        else:
+            page = self._get(key, tag)
+            if page is not None:
+                metrics.count('page_cache.hit')
+                response = Response(page[1], status=page[2], mimetype=page[3])
+            else:
+                metrics.count('page_cache.miss')
+                response = make_response(render())
+                if response.status_code == 200:
+                    if response.is_streamed:
+                        response.response = self._tee(key, tag, response.response, response.status_code,
+                                                      response.mimetype)
+                    else:
+                        self._put(key, (tag, response.get_data(), response.status_code, response.mimetype))
+        if is_get:
+            response.set_etag(tag)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    # decorator for GET views whose page depends only on the URL and the
+    # dictionary
+    def cached(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return self.respond((view.__name__, request.full_path), lambda: view(*args, **kwargs))
+        return wrapper
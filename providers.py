@@ -0,0 +1,382 @@
+"""Definition providers.
+
+A provider wraps one online dictionary behind a single method,
+define(word), which returns {part of speech: [senses]} or None. Lookups
+go through fetch_definition(), which asks every provider at once and
+settles on an answer according to a policy, so a miss on one provider no
+longer adds its full latency in front of the next one.
+
+Apps and scripts build one ProviderRegistry at startup (create_registry())
+and keep it: the provider clients and their pooled HTTP session live as
+long as the process, so steady-state lookups reuse open connections.
+They are only created, and their client libraries only imported, on the
+first lookup, so a process that never looks a word up never loads them.
+"""
+
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import quote
+
+from data import metrics
+from data.fetch_cache import MISS
+
+WORDNIK_URL = 'http://api.wordnik.com/v4'
+WORDNIK_KEY = '263a2b19c795b9844520302bf530266a76754c313e57a5b2d'
+
+
+class PyDictionaryProvider(object):
+    name = 'PyDictionary'
+
+    def __init__(self, client, timeout=5.0):
+        self.client = client
+        self.timeout = timeout
+
+    def define(self, word):
+        return self.client.meaning(word)
+
+
+class WordnikProvider(object):
+    """Wordnik's definitions endpoint, called over a shared requests session
+    so keep-alive connections are reused between lookups."""
+
+    name = 'Wordnik'
+
+    def __init__(self, session, api_key=WORDNIK_KEY, api_url=WORDNIK_URL, timeout=5.0):
+        self.session = session
+        self.api_key = api_key
+        self.api_url = api_url
+        self.timeout = timeout
+
+    def define(self, word):
+        url = '%s/word.json/%s/definitions' % (self.api_url, quote(word, safe=''))
+        response = self.session.get(url, params={'api_key': self.api_key}, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        defn = {}
+        for dfn in response.json():
+            if dfn.get('partOfSpeech') and dfn.get('text'):
+                defn[dfn['partOfSpeech']] = [dfn['text']]
+        return defn
+
+
+class StaticProvider(object):
+    """A local stand-in for an online dictionary, for tests and benchmarks.
+
+    Answers from `definitions` (word -> definition) after sleeping `delay`
+    seconds; words it does not know are misses.
+    """
+
+    def __init__(self, name, definitions, delay=0.0, timeout=5.0):
+        self.name = name
+        self.definitions = definitions
+        self.delay = delay
+        self.timeout = timeout
+
+    def define(self, word):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.definitions.get(word)
+
+
+# Policies decide on an answer from what has come back so far. They get
+# the results (in provider priority order, None for a miss or a provider
+# still running) and which providers are finished, and return a
+# definition, None for "nobody has it", or UNDECIDED to keep waiting.
+UNDECIDED = object()
+
+
+# the first provider to come back with a definition wins
+def first_policy(results, finished, arrived):
+    for i in arrived:
+        if results[i]:
+            return results[i]
+    return None if all(finished) else UNDECIDED
+
+
+# the highest-priority provider with a definition wins, as soon as every
+# provider ahead of it has answered or timed out
+def priority_policy(results, finished, arrived):
+    for i, result in enumerate(results):
+        if not finished[i]:
+            return UNDECIDED
+        if result:
+            return result
+    return None
+
+
+# wait for everyone and merge their senses, higher priority first
+def merge_policy(results, finished, arrived):
+    if not all(finished):
+        return UNDECIDED
+    merged = {}
+    for result in results:
+        for pos, senses in (result or {}).items():
+            kept = merged.setdefault(pos, [])
+            kept.extend(s for s in senses if s not in kept)
+    return merged or None
+
+
+POLICIES = {'first': first_policy, 'priority': priority_policy, 'merge': merge_policy}
+DEFAULT_POLICY = 'priority'
+
+
+class _ProcessPool(object):
+    """A thread pool made on first use in each process, since threads do
+    not survive fork()."""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def get(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='provider')
+                    self._pid = os.getpid()
+        return self._executor
+
+
+# for lookups made without a registry or an executor of their own
+_default_pool = _ProcessPool(16)
+
+
+class _Deadlines(object):
+    """A single daemon thread that runs callbacks at time.monotonic()
+    deadlines, so lookups in flight need no thread of their own to notice
+    a provider timing out."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pid = None
+
+    def call_at(self, deadline, callback):
+        with self._cond:
+            if self._pid != os.getpid():
+                # deadlines inherited across fork() belong to the parent's lookups
+                self._heap = []
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='provider-deadlines')
+                self._thread.daemon = True
+                self._thread.start()
+            heapq.heappush(self._heap, (deadline, next(self._seq), callback))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                callback = heapq.heappop(self._heap)[2]
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+_deadlines = _Deadlines()
+
+
+def _define(provider, word, cache):
+    try:
+        with metrics.span('provider.' + provider.name):
+            defn = provider.define(word) or None
+    except Exception:
+        # a provider that errors out counts as a miss, but is not cached as one
+        metrics.count('provider.error')
+        return None
+    if cache is not None:
+        cache.put(word, provider.name, defn)
+    return defn
+
+
+class _Lookup(object):
+    """One word being looked up: settled from provider calls and deadlines
+    as they happen, rather than by a thread waiting on them.
+
+    A provider's deadline starts when its call starts running, so a call
+    queued behind a busy pool is not timed out before it has begun. Once the
+    lookup is settled, calls still queued are cancelled.
+    """
+
+    def __init__(self, word, providers, decide, cache, executor):
+        self.word = word
+        self.providers = providers
+        self.decide = decide
+        self.cache = cache
+        self.executor = executor
+        self.future = Future()
+        self._lock = threading.Lock()
+        self.results = [None] * len(providers)
+        self.finished = [False] * len(providers)
+        self.arrived = []
+        self._calls = []
+
+    def start(self):
+        if self.cache is not None:
+            for i, provider in enumerate(self.providers):
+                cached = self.cache.get(self.word, provider.name)
+                if cached is not MISS:
+                    self.results[i] = cached
+                    self.finished[i] = True
+                    self.arrived.append(i)
+            with self._lock:
+                self._settle()
+            if self.future.done():
+                return self.future
+
+        with self._lock:
+            for i in range(len(self.providers)):
+                if not self.finished[i]:
+                    self._calls.append(self.executor.submit(self._call, i))
+        return self.future
+
+    # runs on the pool: ask provider `i`, unless the lookup no longer needs it
+    def _call(self, i):
+        with self._lock:
+            if self.finished[i] or self.future.done():
+                return
+        provider = self.providers[i]
+        _deadlines.call_at(time.monotonic() + provider.timeout, functools.partial(self._expire, i))
+        defn = _define(provider, self.word, self.cache)
+        with self._lock:
+            if self.finished[i] or self.future.done():
+                return
+            self.results[i] = defn
+            self.finished[i] = True
+            self.arrived.append(i)
+            self._settle()
+
+    # provider `i` still running past its deadline counts as a miss (its
+    # thread is left to finish in the background)
+    def _expire(self, i):
+        with self._lock:
+            if self.finished[i] or self.future.done():
+                return
+            self.finished[i] = True
+            self._settle()
+
+    def _settle(self):
+        if self.future.done():
+            return
+        try:
+            answer = self.decide(self.results, self.finished, self.arrived)
+        except Exception as exc:
+            self.future.set_exception(exc)
+        else:
+            if answer is UNDECIDED:
+                return
+            self.future.set_result(answer)
+        for call in self._calls:
+            call.cancel()
+
+
+# Look `word` up with every provider concurrently and return a Future of
+# the definition (or None). Each provider gets its own `timeout`, counted
+# from when its call starts running; one that runs over counts as a miss.
+# With a `cache` (data/fetch_cache.py), cached answers and cached misses
+# are used first and only the remaining providers are asked, if the policy
+# still needs them. Nothing blocks on the lookup: the future is settled
+# from the provider calls themselves and a shared deadline thread.
+def fetch_definition_async(word, providers, policy=DEFAULT_POLICY, cache=None, executor=None):
+    decide = POLICIES[policy] if isinstance(policy, str) else policy
+    return _Lookup(word, providers, decide, cache, executor or _default_pool.get()).start()
+
+
+# the same, waiting for the answer
+def fetch_definition(word, providers, policy=DEFAULT_POLICY, cache=None, executor=None):
+    return fetch_definition_async(word, providers, policy, cache, executor).result()
+
+
+class ProviderRegistry(object):
+    """Long-lived providers plus how to combine and cache their answers.
+
+    Built once per process and shared by every request or batch job; see
+    create_registry() for the one the app uses. Given a `factory` instead
+    of providers, it calls factory() -> (providers, session) on first use.
+
+    Its lookups run on a pool of its own, with a thread per provider for
+    each of the `workers` lookups its callers run at once, so a full pool
+    never leaves calls queued behind one another.
+    """
+
+    def __init__(self, providers=None, policy=DEFAULT_POLICY, cache=None, session=None, factory=None,
+                 workers=16):
+        self._providers = providers
+        self._factory = factory
+        self._lock = threading.Lock()
+        self.policy = policy
+        self.cache = cache
+        self.session = session
+        self.workers = workers
+        self._pool = None
+
+    @property
+    def providers(self):
+        if self._providers is None:
+            with self._lock:
+                if self._providers is None:
+                    providers, self.session = self._factory()
+                    self._providers = providers
+        return self._providers
+
+    @providers.setter
+    def providers(self, providers):
+        self._providers = providers
+        self._pool = None
+
+    @property
+    def executor(self):
+        providers = self.providers
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = _ProcessPool(self.workers * max(len(providers), 1))
+        return self._pool.get()
+
+    def fetch(self, word):
+        return fetch_definition(word, self.providers, policy=self.policy, cache=self.cache,
+                                executor=self.executor)
+
+    # a Future of fetch(word), for callers that must not wait on it
+    def fetch_async(self, word):
+        return fetch_definition_async(word, self.providers, policy=self.policy, cache=self.cache,
+                                      executor=self.executor)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+# the providers the app has always used, most trusted first, sharing one
+# pooled HTTP session; their client libraries are imported here, when the
+# registry first needs them, rather than when the app boots
+def default_providers(pool_size=16):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from PyDictionary import PyDictionary
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return [PyDictionaryProvider(PyDictionary()), WordnikProvider(session)], session
+
+
+# a registry for `workers` concurrent lookups, with an HTTP connection for each
+def create_registry(policy=DEFAULT_POLICY, cache=None, workers=16):
+    return ProviderRegistry(policy=policy, cache=cache, factory=functools.partial(default_providers, workers),
+                            workers=workers)
@@ -0,0 +1,2 @@
+from resources.user import User
+from resources.word import Word, WordList
@@ -1,12 +1,56 @@
-from flask_restful import Resource
-import csv
+import sqlite3
 
+from flask import request
+from flask_restful import Resource, abort
+
+from data.models import check_password, delete_user, insert_user, retrieve_user, retrieve_users, update_password
+
+# the user whose name and current password came with the request, as HTTP
+# basic auth; 401 without them, and 403 when `username` is someone else
+def signed_in(username=None):
+	auth = request.authorization
+	if auth is None or not check_password(auth.username, auth.password):
+		abort(401, message="Send your username and password as HTTP basic auth")
+	if username is not None and auth.username != username:
+		abort(403, message="Only %s can change that user" % username)
+	return auth.username
+
+# /api/users and /api/users/<username>; passwords can be set but are never
+# sent back. Anyone can sign up, as on /login; looking users up takes
+# signing in, and changing or deleting one takes signing in as that user.
 class User(Resource):
-	def get(self):
-		pass
-	def post(self):
-		pass
-	def put(self):
-		pass
-	def delete(self):
-		pass
\ No newline at end of file
+	def get(self, username=None):
+		signed_in()
+		if username is None:
+			return {'users': [name for name, _ in retrieve_users()]}
+		if retrieve_user(username) is None:
+			abort(404, message="No such user: %s" % username)
+		return {'username': username}
+
+	def post(self, username=None):
+		body = request.get_json(silent=True) or {}
+		username = username or body.get('username')
+		if not username or not body.get('password'):
+			abort(400, message="A username and a password are required")
+		try:
+			insert_user(username, body['password'])
+		except sqlite3.IntegrityError:
+			abort(409, message="User already exists: %s" % username)
+		return {'username': username}, 201
+
+	def put(self, username=None):
+		body = request.get_json(silent=True) or {}
+		if username is None or not body.get('password'):
+			abort(400, message="A username and a password are required")
+		signed_in(username)
+		if not update_password(username, body['password']):
+			abort(404, message="No such user: %s" % username)
+		return {'username': username}
+
+	def delete(self, username=None):
+		if username is None:
+			abort(400, message="A username is required")
+		signed_in(username)
+		if not delete_user(username):
+			abort(404, message="No such user: %s" % username)
+		return '', 204
@@ -0,0 +1,83 @@
+from flask import Response, jsonify, request
+from flask_restful import Resource, abort
+
+# most words one multi-get may ask for
+MAX_WORDS = 100
+
+
+# Responses to GETs carry an ETag naming the dictionary contents they were
+# made from (see DictionaryStore.etag), and a client or proxy sending it
+# back in If-None-Match gets an empty 304 until the dictionary changes.
+# `payload()` as JSON tagged `tag`, or 304 when the client already has it
+def conditional(tag, payload):
+    if tag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(payload())
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def entry_json(entry):
+    return {'word': entry[0], 'definition': entry[1]}
+
+
+# a definition as sent by clients: {part of speech: [senses]}
+def valid_definition(defn):
+    return (isinstance(defn, dict) and bool(defn) and
+            all(isinstance(pos, str) and isinstance(senses, list) and
+                all(isinstance(s, str) for s in senses) for pos, senses in defn.items()))
+
+
+# /api/words/<word>
+class Word(Resource):
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, word):
+        # named before the lookup, so the tag is never newer than the entry
+        tag = self.store.etag
+        entry = self.store.get(word)
+        if entry is None:
+            abort(404, message="No entry for: %s" % word)
+        return conditional(tag, lambda: entry_json(entry))
+
+    # {"definition": {...}} sets the word's definition, adding the word if
+    # it is new
+    def put(self, word):
+        body = request.get_json(silent=True) or {}
+        defn = body.get('definition')
+        if not valid_definition(defn):
+            abort(400, message="definition must be {part of speech: [senses]}")
+        created = word not in self.store
+        self.store.replace([(word, defn)])
+        return entry_json(self.store.get(word)), 201 if created else 200
+
+    def delete(self, word):
+        if not self.store.delete(word):
+            abort(404, message="No entry for: %s" % word)
+        return '', 204
+
+
+# /api/words?word=a&word=b (or ?word=a,b): several entries in one request,
+# keyed by the word as asked for, null for words not in the dictionary
+class WordList(Resource):
+    def __init__(self, store):
+        self.store = store
+
+    def get(self):
+        words = [w for arg in request.args.getlist('word') for w in arg.split(',') if w.strip()]
+        if not words:
+            abort(400, message="Ask for at least one ?word=")
+        if len(words) > MAX_WORDS:
+            abort(400, message="At most %d words per request" % MAX_WORDS)
+        tag = self.store.etag
+
+        def payload():
+            found = {}
+            for word in words:
+                entry = self.store.get(word)
+                found[word] = entry_json(entry) if entry is not None else None
+            return {'words': found}
+        return conditional(tag, payload)
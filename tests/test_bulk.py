@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+from data.bulk import MalformedUpload, import_rows, read_rows
+from data.store import open_store
+from providers import ProviderRegistry, StaticProvider
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'dictionary.csv'
+    path.write_text('Word,Definition\nknown,"{""Noun"": [""already here""]}"\n')
+    return open_store(str(path))
+
+
+def import_text(store, text, fmt, providers=None):
+    return import_rows(store, read_rows(io.StringIO(text), fmt), providers)
+
+
+def test_unreadable_jsonl_rows_are_counted_and_skipped(store):
+    text = '\n'.join([
+        '{"word": "good", "definition": {"Noun": ["fine"]}}',
+        '{"definition": {"Noun": ["no word"]}}',
+        '{"word": "garbled", "definition": "garbage"}',
+        '{"word": "flat", "definition": {"Noun": "not a list"}}',
+        'not json',
+        '{"word": "known"}',
+        '{"word": "late", "definition": {"Verb": ["after the bad rows"]}}',
+    ])
+    assert import_text(store, text, 'jsonl') == {'added': 2, 'skipped': 1, 'missing': 0, 'invalid': 4}
+    assert store.get('late') == ('late', {'Verb': ['after the bad rows']})
+    assert store.get('garbled') is None
+
+
+def test_rows_without_a_definition_are_fetched(store):
+    providers = ProviderRegistry([StaticProvider('local', {'fetched': {'Noun': ['from a provider']}})])
+    assert import_text(store, 'fetched\nunknown\n', 'txt', providers) == {'added': 1, 'skipped': 0,
+                                                                        'missing': 1, 'invalid': 0}
+    assert store.get('fetched') == ('fetched', {'Noun': ['from a provider']})
+
+
+def test_csv_without_a_word_column_is_refused(store):
+    with pytest.raises(MalformedUpload):
+        import_text(store, 'Term,Meaning\na,b\n', 'csv')
+
+
+def test_bad_csv_definitions_are_invalid(store):
+    text = 'Word,Definition\nbad,garbage\n,"{}"\ngood,"{""Noun"": [""x""]}"\n'
+    assert import_text(store, text, 'csv') == {'added': 1, 'skipped': 0, 'missing': 0, 'invalid': 2}
@@ -0,0 +1,23 @@
+from data.fuzzy import FuzzyIndex
+from data.store import open_store
+
+
+def index_of(tmp_path, words):
+    path = tmp_path / 'dictionary.csv'
+    path.write_text('Word,Definition\n' + ''.join('%s,"{""Noun"": [""x""]}"\n' % word for word in words))
+    index = FuzzyIndex(max_scanned=50)
+    open_store(str(path)).subscribe(index)
+    return index
+
+
+def test_suggests_the_nearest_words(tmp_path):
+    index = index_of(tmp_path, ['abjure', 'abject', 'adjure', 'object', 'zebra'])
+    assert index.suggest('abjore') == ['abjure', 'adjure']
+    assert index.suggest('Objekt') == ['object', 'abject']
+    assert index.suggest('quartz') == []
+
+
+def test_common_trigrams_are_not_walked(tmp_path):
+    # every word shares the padded 's' trigrams, far more than may be scanned
+    index = index_of(tmp_path, ['s%04d' % i for i in range(500)] + ['spectre'])
+    assert index.suggest('spectra') == ['spectre']
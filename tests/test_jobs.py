@@ -0,0 +1,59 @@
+import threading
+
+from data.fetch_cache import FetchCache
+from data.jobs import ADDED, EXISTS, MISSING, AddJobs
+from data.store import open_store
+from providers import ProviderRegistry, StaticProvider
+
+
+class Store(object):
+    """An in-memory stand-in that remembers which thread added each word."""
+
+    def __init__(self):
+        self.words = {}
+        self.threads = []
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def add(self, word, definition):
+        self.threads.append(threading.current_thread().name)
+        self.words[word] = definition
+        return True
+
+
+def registry(delay=0.0):
+    return ProviderRegistry([StaticProvider('static', {'abjure': {'Verb': ['to renounce']}}, delay=delay)])
+
+
+def test_words_are_added_off_the_provider_threads():
+    store = Store()
+    jobs = AddJobs(store, registry(delay=0.05))
+    job = jobs.submit('abjure')
+    assert job.done.wait(5)
+    assert job.state == ADDED
+    assert store.words == {'abjure': {'Verb': ['to renounce']}}
+    assert store.threads[0].startswith('add-job')
+
+
+def test_missing_and_existing_words(tmp_path):
+    path = tmp_path / 'dictionary.csv'
+    path.write_text('Word,Definition\nabjure,"{""Verb"": [""to renounce""]}"\n')
+    jobs = AddJobs(open_store(str(path)), registry())
+    assert jobs.submit('abjure').state == EXISTS
+    job = jobs.submit('abnegation')
+    assert job.done.wait(5)
+    assert job.state == MISSING
+    assert jobs.get(job.id) is job
+
+
+
+def test_a_cached_lookup_finishes_in_submit(tmp_path):
+    cache = FetchCache(str(tmp_path / 'fetch_cache.db'))
+    cache.put('abjure', 'static', {'Verb': ['to renounce']})
+    store = Store()
+    providers = registry()
+    providers.cache = cache
+    job = AddJobs(store, providers).submit('abjure')
+    assert job.state == ADDED
+    assert store.threads == [threading.current_thread().name]
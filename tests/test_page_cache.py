@@ -0,0 +1,26 @@
+from page_cache import PageCache
+
+
+def page(size):
+    return ('tag', b'x' * size, 200, 'text/html')
+
+
+def test_pages_are_evicted_by_total_size():
+    cache = PageCache(store=None, max_bytes=1000, max_page_size=600)
+    cache._put('a', page(400))
+    cache._put('b', page(400))
+    assert cache._get('a', 'tag') is not None
+    cache._put('c', page(400))
+    assert cache._get('b', 'tag') is None
+    assert cache._get('a', 'tag') is not None
+    assert cache._size == 800
+
+
+def test_replacing_a_page_and_oversized_pages():
+    cache = PageCache(store=None, max_bytes=1000, max_page_size=600)
+    cache._put('a', page(400))
+    cache._put('a', page(100))
+    assert cache._size == 100
+    cache._put('b', page(700))
+    assert cache._get('b', 'tag') is None
+    assert cache._size == 100
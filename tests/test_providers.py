@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from data.fetch_cache import MISS, FetchCache
+from providers import ProviderRegistry, StaticProvider, fetch_definition, fetch_definition_async
+
+NOUN = {'Noun': ['a thing']}
+VERB = {'Verb': ['to do a thing']}
+
+
+class CountingProvider(StaticProvider):
+    """A StaticProvider that remembers which words it was asked for."""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingProvider, self).__init__(*args, **kwargs)
+        self.asked = []
+        self._lock = threading.Lock()
+
+    def define(self, word):
+        with self._lock:
+            self.asked.append(word)
+        return super(CountingProvider, self).define(word)
+
+
+class BrokenProvider(StaticProvider):
+    def define(self, word):
+        raise IOError('unreachable')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = FetchCache(str(tmp_path / 'fetch_cache.db'))
+    yield cache
+    cache.pool.close_all()
+
+
+# policies
+
+def test_priority_prefers_the_first_provider():
+    providers = [StaticProvider('a', {'word': NOUN}, delay=0.05), StaticProvider('b', {'word': VERB})]
+    assert fetch_definition('word', providers, policy='priority') == NOUN
+
+
+def test_priority_falls_through_a_miss():
+    providers = [StaticProvider('a', {}), StaticProvider('b', {'word': VERB})]
+    assert fetch_definition('word', providers, policy='priority') == VERB
+
+
+def test_first_takes_whoever_answers_first():
+    providers = [StaticProvider('a', {'word': NOUN}, delay=0.2), StaticProvider('b', {'word': VERB})]
+    assert fetch_definition('word', providers, policy='first') == VERB
+
+
+def test_merge_combines_senses_in_priority_order():
+    providers = [StaticProvider('a', {'word': {'Noun': ['one', 'two']}}),
+                 StaticProvider('b', {'word': {'Noun': ['two', 'three'], 'Verb': ['four']}})]
+    assert fetch_definition('word', providers, policy='merge') == {'Noun': ['one', 'two', 'three'],
+                                                                   'Verb': ['four']}
+
+
+def test_nobody_knows_the_word():
+    providers = [StaticProvider('a', {}), StaticProvider('b', {})]
+    for policy in ('priority', 'first', 'merge'):
+        assert fetch_definition('word', providers, policy=policy) is None
+
+
+def test_a_provider_error_is_a_miss():
+    providers = [BrokenProvider('a', {}), StaticProvider('b', {'word': VERB})]
+    assert fetch_definition('word', providers) == VERB
+
+
+# timeouts
+
+def test_a_slow_provider_times_out_as_a_miss():
+    providers = [StaticProvider('a', {'word': NOUN}, delay=1.0, timeout=0.05),
+                 StaticProvider('b', {'word': VERB})]
+    started = time.monotonic()
+    assert fetch_definition('word', providers) == VERB
+    assert time.monotonic() - started < 0.5
+
+
+def test_timeouts_start_when_the_call_runs():
+    # ten lookups of two providers on two threads: most calls wait in the
+    # queue for far longer than their timeout, but none is cut short
+    words = dict(('w%d' % i, NOUN) for i in range(10))
+    providers = [StaticProvider('a', words, delay=0.05, timeout=0.5),
+                 StaticProvider('b', words, delay=0.05, timeout=0.5)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [fetch_definition_async(word, providers, policy='merge', executor=executor) for word in words]
+        assert [future.result(timeout=5) for future in futures] == [NOUN] * 10
+
+
+def test_queued_calls_are_cancelled_once_settled():
+    first = CountingProvider('a', {'word': NOUN})
+    second = CountingProvider('b', {'word': VERB})
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # keep the only thread busy so both calls queue up behind it
+        gate = threading.Event()
+        executor.submit(gate.wait)
+        future = fetch_definition_async('word', [first, second], policy='first', executor=executor)
+        gate.set()
+        assert future.result(timeout=5) == NOUN
+    assert first.asked == ['word']
+    assert second.asked == []
+
+
+# the fetch cache
+
+def test_answers_and_misses_are_cached(cache):
+    providers = [CountingProvider('a', {}), CountingProvider('b', {'word': VERB})]
+    assert fetch_definition('word', providers, cache=cache) == VERB
+    assert cache.get('word', 'a') is None
+    assert cache.get('word', 'b') == VERB
+    assert fetch_definition('word', providers, cache=cache) == VERB
+    assert [p.asked for p in providers] == [['word'], ['word']]
+
+
+def test_cached_answers_spare_the_remaining_providers(cache):
+    cache.put('word', 'a', NOUN)
+    providers = [CountingProvider('a', {}), CountingProvider('b', {'word': VERB})]
+    assert fetch_definition('word', providers, cache=cache) == NOUN
+    assert [p.asked for p in providers] == [[], []]
+
+
+def test_only_uncached_providers_are_asked(cache):
+    cache.put('word', 'a', None)
+    providers = [CountingProvider('a', {'word': NOUN}), CountingProvider('b', {'word': VERB})]
+    assert fetch_definition('word', providers, cache=cache) == VERB
+    assert [p.asked for p in providers] == [[], ['word']]
+
+
+def test_errors_are_not_cached(cache):
+    providers = [BrokenProvider('a', {}), StaticProvider('b', {})]
+    assert fetch_definition('word', providers, cache=cache) is None
+    assert cache.get('word', 'a') is MISS
+    assert cache.get('word', 'b') is None
+
+
+# the registry
+
+def test_registry_builds_its_providers_on_first_use():
+    built = []
+
+    def factory():
+        built.append(True)
+        return [StaticProvider('a', {'word': NOUN})], None
+
+    registry = ProviderRegistry(factory=factory, workers=2)
+    assert built == []
+    assert registry.fetch('word') == NOUN
+    assert registry.fetch_async('word').result(timeout=5) == NOUN
+    assert built == [True]
+    assert registry.executor._max_workers == 2
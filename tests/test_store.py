@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+
+import pytest
+
+from data.fulltext import DefinitionIndex
+from data.store import DictionaryChanged, open_store
+
+DICTIONARY = 'Word,Definition\nabject,"{""Adjective"": [""sunk to a low condition""]}"\n' \
+             'abjure,"{""Verb"": [""to renounce under oath""]}"\n'
+
+
+class Recorder(object):
+    """A store listener that remembers what it was told."""
+
+    def __init__(self):
+        self.resets = 0
+        self.changes = []
+
+    def reset(self, entries):
+        self.resets += 1
+
+    def added(self, key, entry):
+        self.changes.append(('added', key))
+
+    def removed(self, key):
+        self.changes.append(('removed', key))
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'dictionary.csv'
+    path.write_text(DICTIONARY)
+    return str(path)
+
+
+def test_a_reader_follows_another_process_compacting(path):
+    writer = open_store(path, check_interval=0)
+    reader = open_store(path, check_interval=0)
+    recorder = Recorder()
+    reader.subscribe(recorder)
+    writer.add('abnegation', {'Noun': ['self-denial']})
+    writer.delete('abject')
+    writer.compact()
+    assert [word for word, _ in reader.iter_rows()] == ['abjure', 'abnegation']
+    assert recorder.resets == 1
+    assert recorder.changes == [('added', 'abnegation'), ('removed', 'abject')]
+
+
+def test_a_reader_two_compactions_behind_reloads(path):
+    writer = open_store(path, check_interval=0)
+    reader = open_store(path, check_interval=0)
+    recorder = Recorder()
+    reader.subscribe(recorder)
+    for word in ('one', 'two'):
+        writer.add(word, {'Noun': [word]})
+        writer.compact()
+    assert len(reader) == 4
+    assert recorder.resets == 2
+
+
+def test_changes_do_not_wait_for_an_index_build(path):
+    store = open_store(path, check_interval=0)
+    index = DefinitionIndex()
+    store.subscribe(index)
+    building = threading.Event()
+    release = threading.Event()
+    build = index._build
+
+    def slow_build(entries):
+        building.set()
+        release.wait(5)
+        return build(entries)
+
+    index._build = slow_build
+    searcher = threading.Thread(target=index.search, args=('oath',))
+    searcher.start()
+    assert building.wait(5)
+    started = time.monotonic()
+    store.add('abnegation', {'Noun': ['renouncing under oath']})
+    store.delete('abjure')
+    assert time.monotonic() - started < 1
+    release.set()
+    searcher.join(5)
+    assert [word for word, _, _ in index.search('oath')] == ['abnegation']
+
+
+def test_a_torn_log_tail_is_cut_off_by_the_next_write(path):
+    store = open_store(path, check_interval=0)
+    store.add('abnegation', {'Noun': ['self-denial']})
+    log = path[:-len('.csv')] + '.log'
+    with open(log, 'ab') as f:
+        f.write(b'{"op": "add", "wo')
+    size = os.path.getsize(log)
+    reader = open_store(path, check_interval=0)
+    assert len(reader) == 3
+    assert os.path.getsize(log) == size
+    store.add('abnormal', {'Adjective': ['not normal']})
+    assert [word for word, _ in open_store(path).iter_rows()] == ['abject', 'abjure', 'abnegation', 'abnormal']
+
+
+def test_stores_on_the_same_dictionary_agree_on_its_etag(path):
+    writer = open_store(path, check_interval=0)
+    reader = open_store(path, check_interval=0)
+    assert writer.etag == reader.etag
+    tag = writer.etag
+    writer.add('abnegation', {'Noun': ['self-denial']})
+    assert writer.etag != tag
+    assert writer.etag == reader.etag
+    writer.compact()
+    assert writer.etag == reader.etag
+
+
+def test_compacting_moves_the_store_onto_the_new_snapshot(path):
+    store = open_store(path, check_interval=0)
+    recorder = Recorder()
+    store.subscribe(recorder)
+    store.add('abnegation', {'Noun': ['self-denial']})
+    store.delete('abject')
+    store.compact()
+    base, changed, new_keys = store._entries._layers
+    assert base.path == store.backend.snapshot_path(store._cursor[0])
+    assert not changed and not new_keys
+    assert [word for word, _ in store.iter_rows()] == ['abjure', 'abnegation']
+    assert recorder.resets == 1
+
+
+def test_snapshots_of_older_dictionaries_are_removed(path):
+    store = open_store(path, check_interval=0)
+    len(store)
+    first = store.backend.snapshot_path(store._cursor[0])
+    assert os.path.exists(first)
+    store.add('abnegation', {'Noun': ['self-denial']})
+    store.compact()
+    assert not os.path.exists(first)
+    assert os.path.exists(store.backend.snapshot_path(store._cursor[0]))
+
+
+def test_a_touched_dictionary_keeps_its_changes(path):
+    store = open_store(path, check_interval=0)
+    store.add('abnegation', {'Noun': ['self-denial']})
+    os.utime(path, ns=(0, 10 ** 18))
+    assert store.add('lostword', {'Noun': ['not lost']})
+    assert store.get('lostword') is not None
+    assert not store.add('lostword', {'Noun': ['twice']})
+    assert len(store) == 4
+    store.compact()
+    assert [word for word, _ in open_store(path).iter_rows()] == ['abject', 'abjure', 'abnegation', 'lostword']
+
+
+def test_writes_are_refused_while_the_dictionary_has_changed_under_the_store(path):
+    store = open_store(path, check_interval=0)
+    rows, cursor = store.rows(), store._cursor
+    os.utime(path, ns=(0, 10 ** 18))
+    with pytest.raises(DictionaryChanged):
+        store.backend.commit([{'op': 'delete', 'word': 'abject'}], cursor)
+    with pytest.raises(DictionaryChanged):
+        store.backend.compact(rows, cursor)
+
+
+def test_a_dictionary_replaced_from_outside_is_reloaded(path, tmp_path):
+    store = open_store(path, check_interval=0)
+    recorder = Recorder()
+    store.subscribe(recorder)
+    store.add('abnegation', {'Noun': ['self-denial']})
+    with open(path, 'w') as f:
+        f.write('Word,Definition\nzeal,"{""Noun"": [""great energy""]}"\n')
+    assert [word for word, _ in store.iter_rows()] == ['zeal']
+    assert recorder.resets == 2
+    # the old log was written against another dictionary: kept, not replayed
+    assert len(list(tmp_path.glob('dictionary.orphaned-*.log'))) == 1
+    assert [word for word, _ in open_store(path).iter_rows()] == ['zeal']
+
+
+def test_a_log_from_before_headers_is_replayed(path):
+    log = path[:-len('.csv')] + '.log'
+    with open(log, 'w') as f:
+        f.write('{"op": "add", "word": "abnegation", "definition": {"Noun": ["self-denial"]}}\n')
+    store = open_store(path, check_interval=0)
+    assert [word for word, _ in store.iter_rows()] == ['abject', 'abjure', 'abnegation']
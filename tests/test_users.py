@@ -0,0 +1,48 @@
+import base64
+import os
+import tempfile
+
+# the user API's database, kept out of the repository's data/
+os.environ.setdefault('USERS_PATH', os.path.join(tempfile.mkdtemp(), 'users.db'))
+
+import pytest
+from flask import Flask
+from flask_restful import Api
+
+from data.models import delete_user
+from resources.user import User
+
+
+def basic(username, password):
+    credentials = base64.b64encode(('%s:%s' % (username, password)).encode('utf-8')).decode('ascii')
+    return {'Authorization': 'Basic ' + credentials}
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    Api(app).add_resource(User, '/api/users', '/api/users/<string:username>')
+    client = app.test_client()
+    for name in ('alice', 'mallory'):
+        delete_user(name)
+        assert client.post('/api/users', json={'username': name, 'password': 'secret'}).status_code == 201
+    return client
+
+
+def test_changing_a_password_takes_the_current_one(client):
+    assert client.put('/api/users/alice', json={'password': 'new'}).status_code == 401
+    assert client.put('/api/users/alice', json={'password': 'new'},
+                      headers=basic('alice', 'wrong')).status_code == 401
+    assert client.put('/api/users/alice', json={'password': 'new'},
+                      headers=basic('mallory', 'secret')).status_code == 403
+    assert client.put('/api/users/alice', json={'password': 'new'},
+                      headers=basic('alice', 'secret')).status_code == 200
+    assert client.get('/api/users/alice', headers=basic('alice', 'new')).status_code == 200
+
+
+def test_deleting_and_listing_users_take_signing_in(client):
+    assert client.get('/api/users').status_code == 401
+    assert 'alice' in client.get('/api/users', headers=basic('mallory', 'secret')).get_json()['users']
+    assert client.delete('/api/users/alice').status_code == 401
+    assert client.delete('/api/users/alice', headers=basic('mallory', 'secret')).status_code == 403
+    assert client.delete('/api/users/alice', headers=basic('alice', 'secret')).status_code == 204